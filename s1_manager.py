@@ -6,15 +6,24 @@
 import asyncio
 import csv
 import datetime
+import gzip
+import hashlib
+import io
+import itertools
 import json
 import logging
 import os
 import platform
+import re
+import sqlite3
 import sys
+import tarfile
 import time
 import tkinter as tk
 import tkinter.filedialog
+import tkinter.messagebox
 import tkinter.scrolledtext as ScrolledText
+import zipfile
 from functools import partial
 from pathlib import Path
 from tkinter import UNDERLINE, ttk
@@ -29,6 +38,125 @@ __version__ = "2022.2.4"
 API_VERSION = "v2.1"
 DIR_PATH = os.path.dirname(os.path.realpath(__file__))
 QUERY_LIMITS = "limit=1000"
+DEFAULT_CONCURRENCY = 8
+DEFAULT_BATCH_SIZE = 100
+AGENT_OS_TYPES = ("windows", "windows_legacy", "macos", "linux")
+EXCLUSION_TYPES = ("browser", "certificate", "file_type", "path", "white_hash")
+EXCLUSION_MODES = (
+    "disable_all_monitors",
+    "disable_all_monitors_deep",
+    "disable_in_process_monitor",
+    "disable_in_process_monitor_deep",
+    "suppress",
+    "suppress_app_control",
+    "suppress_dfi_only",
+    "suppress_dynamic_only",
+)
+PATH_EXCLUSION_TYPES = ("file", "subfolders")
+API_RETRIES = 3
+THREAT_ACTION_LIMIT = 2500  # Max per API Docs is 5000, in newer consoles
+THREAT_HASHES_PER_FILTER = 100
+AGENT_IDS_PER_ACTION = 1000
+SCOPE_TREE_TTL = 300  # Seconds
+PACKAGE_CATALOG_TTL = 900  # Seconds
+PACKAGE_EXPORT_FIELDS = (
+    ("Name", "fileName"),
+    ("ID", "id"),
+    ("Version", "version"),
+    ("OS Type", "osType"),
+    ("OS Arch", "osArch"),
+    ("Package Type", "packageType"),
+    ("File Extension", "fileExtension"),
+    ("Status", "status"),
+    ("Scope Level", "scopeLevel"),
+)
+AGENT_IDS_PER_QUERY = 200  # Keeps the ids query string short
+DEFAULT_WAVE_SIZE = 0  # 0 sends every agent in a single wave
+DEFAULT_WAVE_SUCCESS_PERCENT = 90
+DEFAULT_WAVE_TIMEOUT = 30  # Minutes
+UPGRADE_POLL_INTERVAL = 60  # Seconds
+BACKGROUND_STEP_INTERVAL = 10  # Milliseconds
+THREAT_EXPORT_FIELDS = (
+    "id",
+    "threatInfo.threatName",
+    "threatInfo.sha1",
+    "threatInfo.classification",
+    "threatInfo.confidenceLevel",
+    "threatInfo.analystVerdict",
+    "threatInfo.incidentStatus",
+    "threatInfo.createdAt",
+    "agentRealtimeInfo.agentComputerName",
+    "agentRealtimeInfo.siteName",
+    "agentRealtimeInfo.siteId",
+)
+MIGRATED_ENTRY_FIELDS = (
+    "osType",
+    "type",
+    "value",
+    "description",
+    "mode",
+    "pathExclusionType",
+)
+HASH_PATTERN = re.compile(r"[0-9a-f]{40}|[0-9a-f]{64}")
+SHA1_PATTERN = re.compile(r"[0-9a-f]{40}")
+RESULT_COLUMNS = ["Input Name", "Resolved IDs", "HTTP Status", "Affected", "Error"]
+LOCAL_DB_NAME = "s1_manager_local_{console}.db"
+LOCAL_DATASETS = {
+    "agents": {
+        "endpoint": "/agents",
+        "params": {"isDecommissioned": "true,false"},
+        "columns": (
+            "computerName",
+            "uuid",
+            "accountId",
+            "accountName",
+            "siteId",
+            "siteName",
+            "groupId",
+            "groupName",
+            "osType",
+            "agentVersion",
+            "isActive",
+            "updatedAt",
+        ),
+        "deleted_field": "isDecommissioned",
+        "watermark_field": "updatedAt",
+    },
+    "exclusions": {
+        "endpoint": "/exclusions",
+        "params": {"includeChildren": "true", "includeParents": "true"},
+        "columns": (
+            "type",
+            "osType",
+            "value",
+            "mode",
+            "scopeName",
+            "description",
+            "updatedAt",
+        ),
+    },
+    "blacklist": {
+        "endpoint": "/restrictions",
+        "params": {
+            "type": "black_hash",
+            "includeChildren": "true",
+            "includeParents": "true",
+        },
+        "columns": ("value", "osType", "scopeName", "description", "updatedAt"),
+    },
+    "tags": {
+        "endpoint": "/agents/tags",
+        "params": {"includeChildren": "true", "includeParents": "true"},
+        "columns": ("key", "value", "scopeLevel", "scopePath", "description"),
+    },
+    "users": {
+        "endpoint": "/users",
+        "columns": ("email", "fullName", "lowestRole", "scope", "source", "lastLogin"),
+    },
+}
+RANGER_IDENTITY_FIELDS = ("macAddress", "localIp", "hostnames")
+RANGER_VOLATILE_FIELDS = ("id", "firstSeen", "lastSeen", "lastUpdate", "updatedAt")
+AGENT_INVENTORY_FIELDS = "id,uuid,computerName,accountName,siteName,groupName,osType,osName,agentVersion,isActive,networkStatus,lastActiveDate,infected"
 headers = {}
 
 # LOG SETTINGS
@@ -85,6 +213,8 @@ UPDATE_SYSTEM_CONFIG_FRAME = ttk.Frame()
 BULK_ENABLE_AGENTS_FRAME = ttk.Frame()
 IMPORT_BLACKLIST_FRAME = ttk.Frame()
 IMPORT_EXCLUSION_FRAME = ttk.Frame()
+LOCAL_QUERY_FRAME = ttk.Frame()
+MIGRATE_ENTRIES_FRAME = ttk.Frame()
 ERROR = tk.StringVar()
 HOSTNAME = tk.StringVar()
 API_TOKEN = tk.StringVar()
@@ -94,6 +224,23 @@ USE_SSL = tk.BooleanVar()
 USE_SSL.set(True)
 USE_SCHEDULE = tk.BooleanVar()
 USE_SCHEDULE.set(False)
+EXPORT_QUERY_RESULTS = tk.BooleanVar()
+EXPORT_QUERY_RESULTS.set(False)
+MAX_CONCURRENCY = tk.IntVar()
+MAX_CONCURRENCY.set(DEFAULT_CONCURRENCY)
+BATCH_SIZE = tk.IntVar()
+BATCH_SIZE.set(DEFAULT_BATCH_SIZE)
+WAVE_SIZE = tk.IntVar()
+WAVE_SIZE.set(DEFAULT_WAVE_SIZE)
+WAVE_SUCCESS_PERCENT = tk.IntVar()
+WAVE_SUCCESS_PERCENT.set(DEFAULT_WAVE_SUCCESS_PERCENT)
+WAVE_TIMEOUT = tk.IntVar()
+WAVE_TIMEOUT.set(DEFAULT_WAVE_TIMEOUT)
+SCOPE_TREE_CACHE = {}
+PACKAGE_CATALOG_CACHE = {}
+RUNNING_UPGRADE = {}
+PREFLIGHT = tk.BooleanVar()
+PREFLIGHT.set(True)
 
 
 class TextHandler(logging.Handler):
@@ -116,6 +263,135 @@ class TextHandler(logging.Handler):
         self.text.after(0, append)
 
 
+class RowSink:
+    """This class writes rows one at a time to an XLSX, CSV, JSONL or SQLite output file"""
+
+    def __init__(self, output_type, output_file_name, sheet_name, header):
+        self.output_type = output_type
+        self.header = list(header)
+        self.row_count = 0
+
+        if output_type == "xlsx":
+            self.output_file = f"{output_file_name}.xlsx"
+            self.workbook = Workbook(self.output_file, {"constant_memory": True})
+            self.worksheet = self.workbook.add_worksheet(sheet_name)
+            self.worksheet.write_row(0, 0, self.header)
+        elif output_type == "jsonl":
+            self.output_file = f"{output_file_name}.jsonl"
+            self.file = open(self.output_file, "w", encoding="utf-8")
+        elif output_type == "sqlite":
+            self.output_file = f"{output_file_name}.db"
+            table = sheet_name.replace('"', '""')
+            columns = ", ".join(
+                '"' + column.replace('"', '""') + '"' for column in self.header
+            )
+            placeholders = ", ".join("?" for _ in self.header)
+            self.connection = sqlite3.connect(self.output_file)
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({columns})')
+            self.insert = f'INSERT INTO "{table}" VALUES ({placeholders})'
+            self.batch = []
+        else:
+            self.output_file = f"{output_file_name}.csv"
+            self.file = open(self.output_file, "w", newline="", encoding="utf-8")
+            self.csv_writer = csv.writer(self.file)
+            self.csv_writer.writerow(self.header)
+        logging.getLogger().info("Writing output to %s", self.output_file)
+
+    def write(self, row):
+        self.row_count += 1
+        if self.output_type == "xlsx":
+            self.worksheet.write_row(self.row_count, 0, row)
+        elif self.output_type == "jsonl":
+            self.file.write(json.dumps(dict(zip(self.header, row))) + "\n")
+        elif self.output_type == "sqlite":
+            width = len(self.header)
+            self.batch.append((list(row) + [None] * width)[:width])
+            if len(self.batch) >= 10000:
+                self.connection.executemany(self.insert, self.batch)
+                self.batch = []
+        else:
+            self.csv_writer.writerow(row)
+
+    def close(self):
+        if self.output_type == "xlsx":
+            self.workbook.close()
+        elif self.output_type == "sqlite":
+            self.connection.executemany(self.insert, self.batch)
+            self.connection.commit()
+            self.connection.close()
+        else:
+            self.file.close()
+        logging.getLogger().info(
+            "Wrote %d rows to %s", self.row_count, self.output_file
+        )
+        return self.output_file
+
+
+class PaginationError(Exception):
+    """Raised by api_paginate when a page fails and the caller asked to know about it"""
+
+
+class ResultsFile:
+    """This class writes a machine-readable results CSV for a bulk operation, one row per
+    input as it completes"""
+
+    def __init__(self, operation, fieldnames):
+        datestamp = datetime.datetime.now().strftime("%Y-%m-%d_%f")
+        self.csv_filename = f"{operation}_Results_{datestamp}.csv"
+        self.file = open(self.csv_filename, "w", newline="", encoding="utf-8")
+        self.csv_writer = csv.DictWriter(
+            self.file, fieldnames=fieldnames, extrasaction="ignore"
+        )
+        self.csv_writer.writeheader()
+
+    def write(self, result):
+        self.csv_writer.writerow(result)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class JsonArchive:
+    """This class writes one JSON record per agent to a gzip compressed NDJSON file, or as
+    separate JSON files in a zip or tar.gz archive"""
+
+    def __init__(self, output_type, output_file_name):
+        self.output_type = output_type
+        self.output_file = f"{output_file_name}.{output_type}"
+        self.record_count = 0
+        if output_type == "ndjson.gz":
+            self.file = gzip.open(self.output_file, "wt", encoding="utf-8")
+        elif output_type == "zip":
+            self.file = zipfile.ZipFile(
+                self.output_file, "w", compression=zipfile.ZIP_DEFLATED
+            )
+        else:
+            self.file = tarfile.open(self.output_file, "w:gz")
+        logging.getLogger().info("Writing output to %s", self.output_file)
+
+    def write(self, name, record):
+        self.record_count += 1
+        if self.output_type == "ndjson.gz":
+            self.file.write(json.dumps(record) + "\n")
+            return
+        data = json.dumps(record).encode("utf-8")
+        if self.output_type == "zip":
+            self.file.writestr(f"{name}.json", data)
+        else:
+            info = tarfile.TarInfo(f"{name}.json")
+            info.size = len(data)
+            info.mtime = time.time()
+            self.file.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.file.close()
+        logging.getLogger().info(
+            "Wrote %d records to %s", self.record_count, self.output_file
+        )
+        return self.output_file
+
+
 # Helper Functions
 def test_login(hostname, apitoken, proxy):
     """Function to test login using APIToken or Token"""
@@ -208,6 +484,1312 @@ def select_csv_file():
     INPUT_FILE.set(file)
 
 
+def write_rows(rows, output_type, output_file_name, sheet_name):
+    """Function to stream rows (column headers first) into the selected output type.
+    Rows are consumed one at a time so nothing has to be staged in a temporary CSV.
+    Returns the name of the file that was written."""
+    rows = iter(rows)
+    sink = RowSink(output_type, output_file_name, sheet_name, next(rows, []))
+    for row in rows:
+        sink.write(row)
+    return sink.close()
+
+
+def get_field_value(item, field):
+    """Function to get a (dotted) field from an API object as a value that can be written to any RowSink"""
+    value = item
+    for key in field.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def run_async(coro):
+    """Function to run a coroutine to completion on a new event loop"""
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def run_in_background(coro, done):
+    """Function to run a coroutine on a new event loop that is stepped from the Tk event loop,
+    so long waits don't freeze the window. Calls done(task) once the coroutine finishes or
+    is cancelled, and returns the task."""
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(coro)
+
+    def step():
+        # Runs the callbacks and I/O that are ready now, without blocking
+        loop.call_soon(loop.stop)
+        loop.run_forever()
+        if not task.done():
+            window.after(BACKGROUND_STEP_INTERVAL, step)
+            return
+        loop.close()
+        done(task)
+
+    window.after(0, step)
+    return task
+
+
+async def api_request(
+    session, method, endpoint, params=None, payload=None, console=None
+):
+    """Function to send a single API request with aiohttp, backing off and retrying when the
+    console rate limits the request (HTTP 429). Requests go to the logged in console unless a
+    (hostname, headers) console is given. Returns the HTTP status and the decoded JSON body,
+    or the response text if the body is not JSON."""
+    logger = logging.getLogger()
+    hostname, request_headers = console or (HOSTNAME.get(), headers)
+    url = hostname + f"/web/api/{API_VERSION}{endpoint}"
+    data = json.dumps(payload) if payload is not None else None
+    logger.debug(
+        "Calling API with the following:\nURL: %s\tParams: %s\tData: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
+        url,
+        params,
+        data,
+        request_headers,
+        PROXY.get(),
+        USE_SSL.get(),
+    )
+    for attempt in range(API_RETRIES + 1):
+        # aiohttp treats ssl=True as "do not verify", so only pass False to disable verification
+        async with session.request(
+            method,
+            url,
+            params=params,
+            data=data,
+            headers=request_headers,
+            proxy=PROXY.get() or None,
+            ssl=None if USE_SSL.get() else False,
+        ) as response:
+            text = await response.text()
+            retry_after = response.headers.get("Retry-After", "")
+            status = response.status
+        if status != 429 or attempt == API_RETRIES:
+            break
+        delay = float(retry_after) if retry_after.isdigit() else 2**attempt
+        logger.debug("Rate limited by the console, retrying in %s seconds", delay)
+        await asyncio.sleep(delay)
+    try:
+        body = json.loads(text)
+    except ValueError:
+        body = text
+    return status, body
+
+
+async def api_paginate(session, endpoint, params, console=None, raise_on_error=False):
+    """Async generator yielding the 'data' of each page from a cursor-paginated API endpoint.
+    A failed page is logged and ends the iteration, or raises PaginationError if
+    raise_on_error is set so the caller can tell a partial result from a complete one.
+    """
+    logger = logging.getLogger()
+    params = dict(params)
+    while True:
+        status, body = await api_request(
+            session, "GET", endpoint, params=params, console=console
+        )
+        if status != 200:
+            logger.error(
+                "HTTP Response Code: %d - There was a problem with the request to %s. Details - %s",
+                status,
+                endpoint,
+                body,
+            )
+            if raise_on_error:
+                raise PaginationError(status, body)
+            return
+        yield body["data"]
+        cursor = body["pagination"]["nextCursor"]
+        if not cursor:
+            logger.debug("No cursor found for %s", endpoint)
+            return
+        logger.debug("Found next cursor: %s", cursor)
+        params["cursor"] = cursor
+
+
+def get_local_db_name():
+    """Function to get the local database file for the logged in console, so IDs and sync
+    state from one console are never used against another"""
+    console = HOSTNAME.get().split("://")[-1].strip("/")
+    return LOCAL_DB_NAME.format(
+        console=re.sub(r"[^A-Za-z0-9.-]+", "_", console) or "default"
+    )
+
+
+def open_local_db():
+    """Function to open the local SQLite database, creating any missing tables, columns and indexes"""
+    connection = sqlite3.connect(get_local_db_name())
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS sync_state (dataset TEXT PRIMARY KEY, watermark TEXT, synced_at TEXT)"
+    )
+    for dataset, spec in LOCAL_DATASETS.items():
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS "{dataset}" (id TEXT PRIMARY KEY, deleted INTEGER NOT NULL DEFAULT 0, data TEXT)'
+        )
+        existing = {
+            row[1] for row in connection.execute(f'PRAGMA table_info("{dataset}")')
+        }
+        for column in spec["columns"]:
+            if column not in existing:
+                connection.execute(f'ALTER TABLE "{dataset}" ADD COLUMN "{column}"')
+            connection.execute(
+                f'CREATE INDEX IF NOT EXISTS "idx_{dataset}_{column}" ON "{dataset}" ("{column}")'
+            )
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS ranger_scopes (scope_id TEXT PRIMARY KEY, last_run TEXT)"
+    )
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS ranger_devices (scope_id TEXT, identity TEXT, first_seen TEXT, last_seen TEXT, missing INTEGER NOT NULL DEFAULT 0, fingerprint TEXT, data TEXT, PRIMARY KEY (scope_id, identity))"
+    )
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS sys_config_snapshots (run_at TEXT, id_type TEXT, scope_id TEXT, config TEXT, previous TEXT, console TEXT, PRIMARY KEY (run_at, scope_id))"
+    )
+    existing = {
+        row[1] for row in connection.execute("PRAGMA table_info(sys_config_snapshots)")
+    }
+    if "console" not in existing:
+        connection.execute("ALTER TABLE sys_config_snapshots ADD COLUMN console TEXT")
+    connection.commit()
+    return connection
+
+
+def upsert_local_rows(connection, dataset, items):
+    """Function to insert or replace API objects, keyed by ID, in a local dataset table"""
+    spec = LOCAL_DATASETS[dataset]
+    columns = ("id", *spec["columns"], "deleted", "data")
+    column_names = ", ".join(f'"{column}"' for column in columns)
+    placeholders = ", ".join("?" for _ in columns)
+    connection.executemany(
+        f'INSERT OR REPLACE INTO "{dataset}" ({column_names}) VALUES ({placeholders})',
+        [
+            (
+                str(item["id"]),
+                *(get_field_value(item, column) for column in spec["columns"]),
+                1 if item.get(spec.get("deleted_field", "")) else 0,
+                json.dumps(item),
+            )
+            for item in items
+        ],
+    )
+
+
+async def sync_local_dataset(session, connection, dataset):
+    """Function to sync a dataset into the local SQLite database. Datasets with a watermark
+    field only fetch objects changed since the previous sync, others are fully refreshed and
+    anything no longer returned is marked as deleted. Returns the number of objects fetched,
+    or None if a page failed, in which case the local data is left as it was."""
+    logger = logging.getLogger()
+    spec = LOCAL_DATASETS[dataset]
+    params = {"limit": 1000, **spec.get("params", {})}
+    watermark_field = spec.get("watermark_field")
+    if watermark_field:
+        # Ascending order keeps the watermark below any page that has not been read yet
+        params.update({"sortBy": watermark_field, "sortOrder": "asc"})
+    row = connection.execute(
+        "SELECT watermark FROM sync_state WHERE dataset = ?", (dataset,)
+    ).fetchone()
+    watermark = row[0] if row else None
+
+    if watermark_field and watermark:
+        logger.info("Fetching %s changed since %s", dataset, watermark)
+        params[f"{watermark_field}__gt"] = watermark
+    else:
+        logger.info("Fetching all %s", dataset)
+        connection.execute(f'UPDATE "{dataset}" SET deleted = 1')
+
+    total = 0
+    try:
+        async for items in api_paginate(
+            session, spec["endpoint"], params, raise_on_error=True
+        ):
+            upsert_local_rows(connection, dataset, items)
+            total += len(items)
+            if watermark_field:
+                newest = max(
+                    (item.get(watermark_field) or "" for item in items), default=""
+                )
+                watermark = max(watermark or "", newest) or None
+            logger.debug("Synced %d %s so far", total, dataset)
+    except PaginationError:
+        # Drops the deleted flags and rows written so far, and keeps the old watermark
+        connection.rollback()
+        logger.error("Sync of %s failed, the local data was not changed", dataset)
+        return None
+
+    connection.execute(
+        "INSERT OR REPLACE INTO sync_state (dataset, watermark, synced_at) VALUES (?, ?, ?)",
+        (dataset, watermark, datetime.datetime.utcnow().isoformat()),
+    )
+    connection.commit()
+    return total
+
+
+def ranger_identity(item):
+    """Function to build a device identity from the first populated of MAC address, local IP
+    and hostname"""
+    for field in RANGER_IDENTITY_FIELDS:
+        value = item.get(field)
+        if isinstance(value, list):
+            value = ",".join(sorted(str(x) for x in value))
+        if value:
+            return f"{field}:{value}"
+    return None
+
+
+def apply_ranger_snapshot(connection, scope_id, devices, run_at):
+    """Function to diff the current Ranger devices of a scope against the stored snapshot
+    and persist only the differences. Unchanged devices are not rewritten; their last seen
+    time is the scope's last run. Returns (change, identity, first seen, last seen, changed
+    fields) tuples for new, changed and disappeared devices."""
+    scope_row = connection.execute(
+        "SELECT last_run FROM ranger_scopes WHERE scope_id = ?", (scope_id,)
+    ).fetchone()
+    previous_run = scope_row[0] if scope_row else None
+    stored = {
+        identity: (first_seen, missing, fingerprint, data)
+        for identity, first_seen, missing, fingerprint, data in connection.execute(
+            "SELECT identity, first_seen, missing, fingerprint, data FROM ranger_devices WHERE scope_id = ?",
+            (scope_id,),
+        )
+    }
+    changes = []
+    current = set()
+    for item in devices:
+        identity = ranger_identity(item)
+        if not identity or identity in current:
+            continue
+        current.add(identity)
+        stable = {
+            key: value
+            for key, value in item.items()
+            if key not in RANGER_VOLATILE_FIELDS
+        }
+        fingerprint = hashlib.sha1(
+            json.dumps(stable, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        previous = stored.get(identity)
+        if previous is None or previous[1]:
+            first_seen = run_at if previous is None else previous[0]
+            connection.execute(
+                "INSERT OR REPLACE INTO ranger_devices VALUES (?, ?, ?, NULL, 0, ?, ?)",
+                (scope_id, identity, first_seen, fingerprint, json.dumps(stable)),
+            )
+            changes.append(("new", identity, first_seen, run_at, ""))
+        elif previous[2] != fingerprint:
+            old = json.loads(previous[3])
+            changed_fields = sorted(
+                key for key in set(old) | set(stable) if old.get(key) != stable.get(key)
+            )
+            connection.execute(
+                "UPDATE ranger_devices SET fingerprint = ?, data = ? WHERE scope_id = ? AND identity = ?",
+                (fingerprint, json.dumps(stable), scope_id, identity),
+            )
+            changes.append(
+                ("changed", identity, previous[0], run_at, ",".join(changed_fields))
+            )
+    for identity, (first_seen, missing, _, _) in stored.items():
+        if identity not in current and not missing:
+            connection.execute(
+                "UPDATE ranger_devices SET missing = 1, last_seen = ? WHERE scope_id = ? AND identity = ?",
+                (previous_run, scope_id, identity),
+            )
+            changes.append(("disappeared", identity, first_seen, previous_run, ""))
+    connection.execute(
+        "INSERT OR REPLACE INTO ranger_scopes VALUES (?, ?)", (scope_id, run_at)
+    )
+    connection.commit()
+    return changes
+
+
+def lookup_local_agent_ids(id_type, values):
+    """Function to resolve agent IDs from the local agent index by computerName or uuid.
+    Returns a dict of {value: [agent IDs]} for every value found in the index."""
+    found = {}
+    if not os.path.isfile(get_local_db_name()):
+        return found
+    connection = open_local_db()
+    values = list(values)
+    for i in range(0, len(values), 500):
+        chunk = values[i : i + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        for value, agent_id in connection.execute(
+            f'SELECT "{id_type}", id FROM agents WHERE deleted = 0 AND "{id_type}" IN ({placeholders})',
+            chunk,
+        ):
+            found.setdefault(value, []).append(agent_id)
+    connection.close()
+    return found
+
+
+def preprocess_hash_rows(rows):
+    """Function to normalize, validate and deduplicate blacklist CSV rows before import.
+    Hashes are lower-cased and must be SHA1 or SHA256 hex; repeated (osType, hash) pairs
+    are dropped. Returns the (line number, entry) pairs to import, the invalid rows, and the
+    number of duplicate hashes skipped."""
+    entries = []
+    invalid = []
+    seen = set()
+    duplicate_count = 0
+    for line_number, row in enumerate(rows, start=2):
+        if not any(x.strip() for x in row):
+            continue
+        value = row[0].strip().lower()
+        os_type = row[1].strip() if len(row) > 1 else ""
+        if not HASH_PATTERN.fullmatch(value) or os_type not in AGENT_OS_TYPES:
+            invalid.append((line_number, row))
+            continue
+        key = (os_type, value)
+        if key in seen:
+            duplicate_count += 1
+            continue
+        seen.add(key)
+        description = row[2].strip() if len(row) > 2 else ""
+        entries.append(
+            (
+                line_number,
+                {
+                    "osType": os_type,
+                    "type": "black_hash",
+                    "value": value,
+                    "description": description,
+                },
+            )
+        )
+    return entries, invalid, duplicate_count
+
+
+def build_local_query(dataset, filters, group_by):
+    """Function to build SQL for the local query engine. Filters are 'column<op>value'
+    separated by ';', where op is one of = != > < >= <= or ~ (contains, not case sensitive).
+    Columns not indexed for the dataset are read from the stored JSON with dotted paths.
+    Returns the SQL, its parameters and the result column names."""
+    spec = LOCAL_DATASETS[dataset]
+
+    def column_sql(column):
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_.]*", column):
+            raise ValueError(f"Invalid column name: {column}")
+        if column == "id" or column in spec["columns"]:
+            return f'"{column}"'
+        return f"json_extract(data, '$.{column}')"
+
+    conditions = ["deleted = 0"]
+    params = []
+    for condition in filter(None, (x.strip() for x in filters.split(";"))):
+        match = re.fullmatch(r"([^=!<>~]+?)\s*(!=|>=|<=|=|>|<|~)\s*(.*)", condition)
+        if not match:
+            raise ValueError(f"Invalid filter: {condition}")
+        column, operator, value = match.groups()
+        column = column_sql(column.strip())
+        # JSON booleans and numbers are stored as SQLite integers/reals, not text
+        typed_value = value
+        if value.lower() in ("true", "false"):
+            typed_value = int(value.lower() == "true")
+        elif re.fullmatch(r"-?\d+", value):
+            typed_value = int(value)
+        elif re.fullmatch(r"-?\d*\.\d+", value):
+            typed_value = float(value)
+        if operator == "~":
+            conditions.append(f"{column} LIKE ?")
+            params.append(f"%{value}%")
+        elif operator in ("=", "!="):
+            conditions.append(
+                f"{column} {'IN' if operator == '=' else 'NOT IN'} (?, ?)"
+            )
+            params.extend([value, typed_value])
+        else:
+            conditions.append(f"{column} {operator} ?")
+            params.append(typed_value)
+    where = " AND ".join(conditions)
+
+    group_columns = [x.strip() for x in group_by.split(",") if x.strip()]
+    if group_columns:
+        selected = ", ".join(column_sql(column) for column in group_columns)
+        sql = f'SELECT {selected}, COUNT(*) FROM "{dataset}" WHERE {where} GROUP BY {selected} ORDER BY COUNT(*) DESC'
+        return sql, params, group_columns + ["count"]
+    columns = ["id", *spec["columns"]]
+    selected = ", ".join(f'"{column}"' for column in columns)
+    return f'SELECT {selected} FROM "{dataset}" WHERE {where}', params, columns
+
+
+def iter_json_archive(file_name):
+    """Generator yielding the records of a local config export, read from an NDJSON(.gz)
+    file or from the JSON files in a zip or tar.gz archive"""
+    if file_name.endswith(".zip"):
+        with zipfile.ZipFile(file_name) as archive:
+            for name in archive.namelist():
+                if name.endswith(".json"):
+                    yield json.loads(archive.read(name))
+    elif file_name.endswith((".tar.gz", ".tgz", ".tar")):
+        with tarfile.open(file_name) as archive:
+            for member in archive:
+                if member.isfile() and member.name.endswith(".json"):
+                    yield json.load(archive.extractfile(member))
+    else:
+        opener = gzip.open if file_name.endswith(".gz") else open
+        with opener(file_name, "rt", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def normalize_config(value, ignored, path=""):
+    """Function to drop ignored keys, matched by key name or dotted path, from a config"""
+    if isinstance(value, dict):
+        normalized = {}
+        for key, item in value.items():
+            key_path = f"{path}.{key}" if path else str(key)
+            if key in ignored or key_path in ignored:
+                continue
+            normalized[key] = normalize_config(item, ignored, key_path)
+        return normalized
+    if isinstance(value, list):
+        return [normalize_config(item, ignored, path) for item in value]
+    return value
+
+
+def flatten_config(value, path=""):
+    """Function to flatten a config into {dotted path: canonical JSON of the leaf value}.
+    Lists are compared as a whole."""
+    if isinstance(value, dict) and value:
+        flat = {}
+        for key, item in value.items():
+            flat.update(flatten_config(item, f"{path}.{key}" if path else str(key)))
+        return flat
+    return {path: json.dumps(value, sort_keys=True)}
+
+
+def cluster_configs(records, ignored):
+    """Function to group agents by identical normalized configuration. Each top level
+    subtree is hashed once per agent, so the cost is linear in the number of agents.
+    Returns clusters, largest first, with the subtree hashes, one representative config
+    and the member records."""
+    clusters = {}
+    for record in records:
+        config = normalize_config(record.get("config"), ignored)
+        subtrees = config if isinstance(config, dict) else {"": config}
+        subtree_hashes = {
+            key: hashlib.sha1(
+                json.dumps(subtree, sort_keys=True).encode("utf-8")
+            ).hexdigest()
+            for key, subtree in subtrees.items()
+        }
+        config_hash = hashlib.sha1(
+            json.dumps(subtree_hashes, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        if config_hash not in clusters:
+            clusters[config_hash] = {
+                "hash": config_hash,
+                "subtree_hashes": subtree_hashes,
+                "subtrees": subtrees,
+                "members": [],
+            }
+        clusters[config_hash]["members"].append(
+            {key: record.get(key) for key in ("agentId", "uuid", "computerName")}
+        )
+    return sorted(clusters.values(), key=lambda x: len(x["members"]), reverse=True)
+
+
+def diff_clusters(baseline, cluster):
+    """Function to list the keys that differ between two clusters, only flattening the top
+    level subtrees whose hashes differ. Returns (key, baseline value, cluster value) tuples.
+    """
+    differences = []
+    subtree_keys = sorted(
+        set(baseline["subtree_hashes"]) | set(cluster["subtree_hashes"]), key=str
+    )
+    for key in subtree_keys:
+        if baseline["subtree_hashes"].get(key) == cluster["subtree_hashes"].get(key):
+            continue
+        base_flat = (
+            flatten_config(baseline["subtrees"][key], key)
+            if key in baseline["subtrees"]
+            else {}
+        )
+        cluster_flat = (
+            flatten_config(cluster["subtrees"][key], key)
+            if key in cluster["subtrees"]
+            else {}
+        )
+        for path in sorted(set(base_flat) | set(cluster_flat)):
+            if base_flat.get(path) != cluster_flat.get(path):
+                differences.append(
+                    (
+                        path,
+                        base_flat.get(path, "<missing>"),
+                        cluster_flat.get(path, "<missing>"),
+                    )
+                )
+    return differences
+
+
+def diff_sys_config(current, new_data):
+    """Function to compare new system configuration data against the current configuration.
+    Returns the keys whose value changes, and the current values of those keys for rollback.
+    """
+    missing = object()
+    changes = {
+        key: value
+        for key, value in new_data.items()
+        if current.get(key, missing) != value
+    }
+    previous = {key: current[key] for key in changes if key in current}
+    return changes, previous
+
+
+def plan_agent_moves(rows, agent_ids):
+    """Function to group the agent IDs of (name, group ID, site ID) rows by target site and
+    by target group. Returns two dicts of target ID to agent IDs, without duplicates."""
+    sites = {}
+    groups = {}
+    for name, group_id, site_id in rows:
+        for agent_id in agent_ids.get(name, []):
+            sites.setdefault(site_id, {})[agent_id] = None
+            groups.setdefault(group_id, {})[agent_id] = None
+    return (
+        {site_id: list(ids) for site_id, ids in sites.items()},
+        {group_id: list(ids) for group_id, ids in groups.items()},
+    )
+
+
+def version_key(version):
+    """Function to turn a dotted version string into a tuple that sorts numerically"""
+    return tuple(int(x) for x in re.findall(r"\d+", version or ""))
+
+
+def pick_package(packages, agent, version=""):
+    """Function to pick the package to upgrade an agent to: a matching agent package for its
+    OS type, architecture and installer type (.msi or .exe, .deb or .rpm) at the given
+    version, or the newest GA release if there is one. Returns None if no package matches,
+    including when the agent's installer type is not known."""
+    os_arch = agent.get("osArch")
+    extension = (agent.get("installerType") or "").lower()
+    if not extension:
+        return None
+    if not extension.startswith("."):
+        extension = f".{extension}"
+    candidates = [
+        package
+        for package in packages
+        if package.get("osType") == agent.get("osType")
+        and package.get("packageType") == "Agent"
+        and (not os_arch or not package.get("osArch") or package["osArch"] == os_arch)
+        and (package.get("fileExtension") or "").lower() == extension
+        and (not version or package.get("version") == version)
+    ]
+    if not candidates:
+        return None
+    return max(
+        candidates,
+        key=lambda package: (
+            package.get("status") == "ga",
+            version_key(package.get("version")),
+        ),
+    )
+
+
+def plan_package_upgrades(agents_by_name, packages, package_id="", version=""):
+    """Function to group agents by the package they should be upgraded to, either the given
+    package ID or the package picked for each agent. Returns a dict of package ID to agent
+    IDs, and a list of (name, reason) for agents that are skipped."""
+    catalog = {package["id"]: package for package in packages}
+    planned = {}
+    skipped = []
+    for name, agents in agents_by_name.items():
+        if not agents:
+            skipped.append((name, "No agent found with this name"))
+        for agent in agents:
+            if package_id:
+                # A package that is not in the catalog is sent as given
+                package = catalog.get(package_id, {"id": package_id})
+                if package.get("osType", agent.get("osType")) != agent.get("osType"):
+                    skipped.append(
+                        (name, f"Package {package_id} is not for {agent.get('osType')}")
+                    )
+                    continue
+            else:
+                package = pick_package(packages, agent, version)
+                if not package:
+                    wanted = " ".join(
+                        str(x)
+                        for x in (
+                            agent.get("osType"),
+                            agent.get("osArch"),
+                            agent.get("installerType") or "unknown installer type",
+                            version,
+                        )
+                        if x
+                    )
+                    skipped.append((name, f"No package for {wanted}"))
+                    continue
+                # An explicit package ID is sent as given, so it can reinstall or downgrade
+                if version_key(agent.get("agentVersion")) >= version_key(
+                    package["version"]
+                ):
+                    skipped.append(
+                        (name, f"Agent is already on {agent.get('agentVersion')}")
+                    )
+                    continue
+            planned.setdefault(package["id"], []).append(agent["id"])
+    return planned, skipped
+
+
+def plan_upgrade_waves(planned, wave_size):
+    """Function to split planned upgrades (package ID to agent IDs) into waves of at most
+    wave_size agents, or a single wave if wave_size is 0. Each wave is a list of
+    (package ID, agent IDs) batches of at most AGENT_IDS_PER_ACTION agents."""
+    pairs = [
+        (package_id, agent_id)
+        for package_id, agent_ids in planned.items()
+        for agent_id in agent_ids
+    ]
+    size = wave_size or len(pairs) or 1
+    waves = []
+    for i in range(0, len(pairs), size):
+        grouped = {}
+        for package_id, agent_id in pairs[i : i + size]:
+            grouped.setdefault(package_id, []).append(agent_id)
+        waves.append(
+            [
+                (package_id, agent_ids[j : j + AGENT_IDS_PER_ACTION])
+                for package_id, agent_ids in grouped.items()
+                for j in range(0, len(agent_ids), AGENT_IDS_PER_ACTION)
+            ]
+        )
+    return waves
+
+
+def is_upgraded(agent, target_version, original_version):
+    """Function to check if an agent reached the target version, or changed version if the
+    target version is not known"""
+    if target_version:
+        # Equal rather than newer, since an explicit package can be a downgrade
+        return version_key(agent.get("agentVersion")) == version_key(target_version)
+    return agent.get("agentVersion") != original_version
+
+
+def build_threat_filters(names, hashes):
+    """Function to build threat filters for a set of threat names and SHA1s. Names get one
+    filter each, hashes are batched THREAT_HASHES_PER_FILTER per contentHashes filter.
+    """
+    filters = [{"threatDetails__contains": f'"{name}"'} for name in names]
+    hashes = list(hashes)
+    for i in range(0, len(hashes), THREAT_HASHES_PER_FILTER):
+        filters.append(
+            {"contentHashes": ",".join(hashes[i : i + THREAT_HASHES_PER_FILTER])}
+        )
+    return filters
+
+
+def filter_to_params(api_filter):
+    """Function to convert a JSON action filter into GET query parameters"""
+    params = {}
+    for key, value in api_filter.items():
+        if isinstance(value, bool):
+            value = str(value).lower()
+        elif isinstance(value, (list, tuple)):
+            value = ",".join(str(x) for x in value)
+        params[key] = value
+    return params
+
+
+async def count_matching(session, endpoint, api_filter):
+    """Function to count the objects matching a filter with a countOnly request. Returns
+    None if the request failed."""
+    status, body = await api_request(
+        session,
+        "GET",
+        endpoint,
+        params={**filter_to_params(api_filter), "countOnly": "true"},
+    )
+    if status != 200:
+        logging.getLogger().error(
+            "Status: %s Problem with the request. Details - %s", status, body
+        )
+        return None
+    return int(body["pagination"]["totalItems"])
+
+
+async def resolve_matching_threats(session, threat_filter, verdict, progress):
+    """Function to note and resolve the unresolved threats matching a filter, in rounds of
+    THREAT_ACTION_LIMIT until a round affects fewer threats than the limit. Adds the number
+    resolved to progress["resolved"] and calls progress["report"] after each round."""
+    logger = logging.getLogger()
+    action_filter = {**threat_filter, "resolved": False, "limit": THREAT_ACTION_LIMIT}
+    note = f"Analyst Verdict: '{verdict}'\nIncident Status: 'resolved'\n\n- Set via S1 Manager."
+    while True:
+        status, body = await api_request(
+            session,
+            "POST",
+            "/threats/notes",
+            payload={"filter": action_filter, "data": {"text": note}},
+        )
+        if status != 200:
+            logger.error(
+                "Status: %s Problem with the request. Details - %s", status, body
+            )
+            return
+        status, body = await api_request(
+            session,
+            "POST",
+            "/threats/incident",
+            payload={
+                "filter": action_filter,
+                "data": {"incidentStatus": "resolved", "analystVerdict": verdict},
+            },
+        )
+        if status != 200:
+            logger.error(
+                "Status: %s Problem with the request. Details - %s", status, body
+            )
+            return
+        affected = body["data"]["affected"]
+        progress["resolved"] += affected
+        progress["report"]()
+        if affected < THREAT_ACTION_LIMIT:
+            return
+
+
+async def get_scope_tree(session):
+    """Function to get every site visible to the logged in user, with its account name.
+    The result is cached per console and token for SCOPE_TREE_TTL seconds. Returns a dict
+    of site ID to site object, or None if the sites could not all be fetched."""
+    key = (HOSTNAME.get(), API_TOKEN.get())
+    cached = SCOPE_TREE_CACHE.get(key)
+    if cached and time.monotonic() - cached[0] < SCOPE_TREE_TTL:
+        return cached[1]
+    sites = {}
+    try:
+        async for page in api_paginate(
+            session, "/sites", {"limit": 1000}, raise_on_error=True
+        ):
+            for site in page["sites"]:
+                sites[site["id"]] = site
+    except PaginationError:
+        # A partial site list is not cached, so the next call fetches it again
+        logging.getLogger().error("Could not get the full list of sites")
+        return None
+    SCOPE_TREE_CACHE[key] = (time.monotonic(), sites)
+    logging.getLogger().debug("Cached %d sites", len(sites))
+    return sites
+
+
+async def get_package_catalog(session):
+    """Function to get the agent packages available to the logged in user, newest first.
+    The result is cached per console and token for PACKAGE_CATALOG_TTL seconds. Returns
+    None if the packages could not all be fetched."""
+    key = (HOSTNAME.get(), API_TOKEN.get())
+    cached = PACKAGE_CATALOG_CACHE.get(key)
+    if cached and time.monotonic() - cached[0] < PACKAGE_CATALOG_TTL:
+        return cached[1]
+    packages = []
+    try:
+        async for data in api_paginate(
+            session,
+            "/update/agent/packages",
+            {"sortBy": "updatedAt", "sortOrder": "desc", "limit": 1000},
+            raise_on_error=True,
+        ):
+            packages.extend(data)
+    except PaginationError:
+        # A partial catalog is not cached, so the next call fetches it again
+        logging.getLogger().error("Could not get the full list of agent packages")
+        return None
+    PACKAGE_CATALOG_CACHE[key] = (time.monotonic(), packages)
+    logging.getLogger().debug("Cached %d agent packages", len(packages))
+    return packages
+
+
+async def fetch_agents_by_name(session, names):
+    """Function to get the agents with each endpoint name concurrently, one request per name.
+    Names that could not be looked up are left out, names without agents map to []."""
+    logger = logging.getLogger()
+    resolved = {}
+
+    async def fetch(name):
+        status, body = await api_request(
+            session,
+            "GET",
+            "/agents",
+            params={"countOnly": "false", "computerName": name, "limit": 1000},
+        )
+        if status != 200:
+            logger.error(
+                "Failed to get ID for endpoint %s Error code: %s Description: %s",
+                name,
+                status,
+                body,
+            )
+            return
+        resolved[name] = body["data"]
+
+    await gather_bounded(fetch, names)
+    return resolved
+
+
+async def resolve_agent_names(session, names):
+    """Function to resolve endpoint names to agent IDs concurrently, one request per name.
+    Names that could not be looked up are left out, names without agents map to []."""
+    agents = await fetch_agents_by_name(session, names)
+    return {name: [agent["id"] for agent in found] for name, found in agents.items()}
+
+
+def add_concurrency_control(master):
+    """Function to build a labelled spinbox bound to MAX_CONCURRENCY, returned
+    ungridded so the caller can place it"""
+    control = ttk.Frame(master=master)
+    tk.Label(master=control, text="Max concurrent requests:").grid(
+        row=0, column=0, padx=5
+    )
+    ttk.Spinbox(
+        master=control,
+        from_=1,
+        to=32,
+        textvariable=MAX_CONCURRENCY,
+        width=5,
+    ).grid(row=0, column=1, padx=5)
+    return control
+
+
+def add_preflight_control(master):
+    """Function to build a switch bound to PREFLIGHT, returned ungridded so the caller
+    can place it"""
+    return ttk.Checkbutton(
+        master=master,
+        text="Preflight count and confirm before running",
+        style="Switch",
+        variable=PREFLIGHT,
+        onvalue=True,
+        offvalue=False,
+    )
+
+
+async def count_each(session, endpoint, filters):
+    """Function to count the objects matching each filter concurrently. Failed counts are None."""
+    return await gather_bounded(
+        lambda api_filter: count_matching(session, endpoint, api_filter), filters
+    )
+
+
+def confirm_preflight(operation, inputs, counts, noun):
+    """Function to write a preflight report of how many objects each input will affect, then
+    ask the user to confirm the real run. Returns False if nothing matched or the user
+    cancelled."""
+    logger = logging.getLogger()
+    datestamp = datetime.datetime.now().strftime("%Y-%m-%d_%f")
+    output_file = write_rows(
+        itertools.chain(
+            [["Input", "Matched"]],
+            (
+                [value, "Error" if count is None else count]
+                for value, count in zip(inputs, counts)
+            ),
+        ),
+        "csv",
+        f"{operation}_Preflight_{datestamp}",
+        "Preflight",
+    )
+    total = sum(count or 0 for count in counts)
+    failed = sum(count is None for count in counts)
+    logger.info(
+        "Preflight: %d %s matched by %d input(s), %d input(s) could not be counted. Details in %s",
+        total,
+        noun,
+        len(counts) - failed,
+        failed,
+        output_file,
+    )
+    if not total:
+        logger.info("Nothing to change.")
+        return False
+    message = f"{total} {noun} will be affected by {operation.replace('_', ' ')}."
+    if failed:
+        message += f"\n{failed} input(s) could not be counted."
+    if not tkinter.messagebox.askyesno("Confirm", f"{message}\n\nContinue?"):
+        logger.info("Cancelled, no changes were made.")
+        return False
+    return True
+
+
+def get_concurrency():
+    """Function to read the max concurrent requests setting, falling back to the default"""
+    try:
+        return max(1, MAX_CONCURRENCY.get())
+    except tk.TclError:
+        return DEFAULT_CONCURRENCY
+
+
+async def gather_bounded(worker, items):
+    """Function to await worker(item) for every item, with at most MAX_CONCURRENCY running at once"""
+    semaphore = asyncio.Semaphore(get_concurrency())
+
+    async def bounded(item):
+        async with semaphore:
+            return await worker(item)
+
+    return await asyncio.gather(*(bounded(item) for item in items))
+
+
+def get_batch_size():
+    """Function to read the entries per request setting, falling back to the default"""
+    try:
+        return max(1, BATCH_SIZE.get())
+    except tk.TclError:
+        return DEFAULT_BATCH_SIZE
+
+
+def get_wave_settings():
+    """Function to read the upgrade wave size, success percentage and timeout (minutes)
+    settings, falling back to the defaults"""
+    try:
+        size = max(0, WAVE_SIZE.get())
+    except tk.TclError:
+        size = DEFAULT_WAVE_SIZE
+    try:
+        success_percent = min(100, max(0, WAVE_SUCCESS_PERCENT.get()))
+    except tk.TclError:
+        success_percent = DEFAULT_WAVE_SUCCESS_PERCENT
+    try:
+        timeout = max(1, WAVE_TIMEOUT.get())
+    except tk.TclError:
+        timeout = DEFAULT_WAVE_TIMEOUT
+    return size, success_percent, timeout
+
+
+def scope_filter(scope, scope_ids):
+    """Function to build the payload filter for an account, site or group scope"""
+    return {"tenant": False, f"{scope}Ids": scope_ids}
+
+
+def normalize_exclusion_path(value, os_type):
+    """Function to normalize path separators for the OS type, collapsing repeated separators
+    while keeping a leading UNC prefix"""
+    if os_type.startswith("windows"):
+        value = value.replace("/", "\\")
+        return value[:2] + re.sub(r"\\{2,}", r"\\", value[2:])
+    return re.sub(r"/{2,}", "/", value)
+
+
+def entry_key(entry):
+    """Function to build the comparison key of an exclusion or restriction entry. Values are
+    compared case-insensitively, except paths on case-sensitive operating systems."""
+    value = entry["value"]
+    if entry["type"] == "path":
+        value = normalize_exclusion_path(value, entry["osType"])
+        if not entry["osType"].startswith("windows"):
+            return (entry["type"], entry["osType"], value)
+    return (entry["type"], entry["osType"], value.lower())
+
+
+def parse_exclusion_rows(rows):
+    """Function to validate and normalize exclusion CSV rows before anything is sent to the
+    console. Returns a list of (line number, entry) tuples, a list of validation errors and a
+    list of duplicate rows that were skipped."""
+    entries = []
+    errors = []
+    duplicates = []
+    seen = {}
+    for line_number, row in enumerate(rows, start=2):
+        if not any(x.strip() for x in row):
+            continue
+        row = [x.strip() for x in row] + [""] * (6 - len(row))
+        value, type, os_type, mode, path_excl_type, description = row[:6]
+        problems = []
+        if not value:
+            problems.append("value is empty")
+        if type not in EXCLUSION_TYPES:
+            problems.append(f"type '{type}' is not one of {', '.join(EXCLUSION_TYPES)}")
+        if os_type not in AGENT_OS_TYPES:
+            problems.append(
+                f"osType '{os_type}' is not one of {', '.join(AGENT_OS_TYPES)}"
+            )
+        if type == "path":
+            if mode not in EXCLUSION_MODES:
+                problems.append(
+                    f"mode '{mode}' is not one of {', '.join(EXCLUSION_MODES)}"
+                )
+            if path_excl_type not in PATH_EXCLUSION_TYPES:
+                problems.append(
+                    f"pathExclusionType '{path_excl_type}' is not one of {', '.join(PATH_EXCLUSION_TYPES)}"
+                )
+        if problems:
+            errors.append(f"Row {line_number}: {'; '.join(problems)}")
+            continue
+
+        entry = {
+            "osType": os_type,
+            "type": type,
+            "value": value,
+            "description": description,
+        }
+        if type == "path":
+            entry["value"] = normalize_exclusion_path(value, os_type)
+            entry["mode"] = mode
+            entry["pathExclusionType"] = path_excl_type
+        key = entry_key(entry)
+        if key in seen:
+            duplicates.append(
+                f"Row {line_number}: duplicate of row {seen[key]} ({entry['value']})"
+            )
+            continue
+        seen[key] = line_number
+        entries.append((line_number, entry))
+    return entries, errors, duplicates
+
+
+async def create_scoped_entries(session, endpoint, payload_filter, entries):
+    """Function to create exclusion or restriction entries in a scope. Entries are sent as a
+    single request with a list payload; if the console rejects the batch each entry is sent
+    on its own, so one bad value does not fail the rest. Returns a list of
+    (entry, HTTP status, error) tuples."""
+    logger = logging.getLogger()
+    if len(entries) > 1:
+        status, body = await api_request(
+            session,
+            "POST",
+            endpoint,
+            payload={"filter": payload_filter, "data": entries},
+        )
+        if status == 200:
+            return [(entry, status, "") for entry in entries]
+        logger.debug(
+            "Batch of %d entries rejected with status %s, sending individually",
+            len(entries),
+            status,
+        )
+    results = []
+    for entry in entries:
+        status, body = await api_request(
+            session,
+            "POST",
+            endpoint,
+            payload={"filter": payload_filter, "data": entry},
+        )
+        results.append((entry, status, "" if status == 200 else body))
+    return results
+
+
+async def delete_scoped_entries(session, endpoint, items):
+    """Function to delete exclusion or restriction entries by ID, one request per type and
+    chunk of IDs. Returns a list of (item, HTTP status, error) tuples."""
+    by_type = {}
+    for item in items:
+        by_type.setdefault(item["type"], []).append(item)
+    results = []
+    for entry_type, typed_items in by_type.items():
+        for i in range(0, len(typed_items), 1000):
+            chunk = typed_items[i : i + 1000]
+            status, body = await api_request(
+                session,
+                "DELETE",
+                endpoint,
+                payload={"data": {"type": entry_type, "ids": [x["id"] for x in chunk]}},
+            )
+            error = "" if status == 200 else body
+            results.extend((item, status, error) for item in chunk)
+    return results
+
+
+async def fetch_scoped_entries(session, endpoint, params, scope, scope_ids):
+    """Function to page the existing exclusions or restrictions defined directly on each
+    scope ID, fetching the scopes concurrently. Returns a dict of {scope ID: [items]}, or
+    raises PaginationError if any page fails so a partial list is never used as complete.
+    """
+
+    async def fetch(scope_id):
+        items = []
+        async for page in api_paginate(
+            session,
+            endpoint,
+            {
+                "limit": 1000,
+                **params,
+                f"{scope}Ids": scope_id,
+                "includeChildren": "false",
+                "includeParents": "false",
+            },
+            raise_on_error=True,
+        ):
+            items.extend(page)
+        return items
+
+    fetched = await gather_bounded(fetch, scope_ids)
+    return dict(zip(scope_ids, fetched))
+
+
+def plan_scoped_sync(entries, existing, scope_ids):
+    """Function to diff desired entries against the entries already on each scope, keyed on
+    type, osType and value. Returns the creates as {scope IDs missing the entry: [entries]},
+    the number of entries already present everywhere, and (scope ID, item) pairs for the
+    existing items not in the desired set."""
+    desired_keys = {entry_key(entry) for _, entry in entries}
+    existing_keys = {
+        scope_id: {entry_key(item) for item in items}
+        for scope_id, items in existing.items()
+    }
+    creates = {}
+    unchanged = 0
+    for line_number, entry in entries:
+        key = entry_key(entry)
+        missing = tuple(x for x in scope_ids if key not in existing_keys[x])
+        if missing:
+            creates.setdefault(missing, []).append((line_number, entry))
+        else:
+            unchanged += 1
+    removed = [
+        (scope_id, item)
+        for scope_id, items in existing.items()
+        for item in items
+        if entry_key(item) not in desired_keys
+    ]
+    return creates, unchanged, removed
+
+
+def import_scoped_entries(
+    endpoint,
+    list_params,
+    scope,
+    scope_ids,
+    entries,
+    label,
+    sync_mode=False,
+    sync_delete=False,
+):
+    """Function to submit validated (line number, entry) pairs to every scope ID. Entries are
+    grouped by osType and type, chunked into batches and sent concurrently. In sync mode the
+    existing entries on each scope are fetched first and entries are only created on the
+    scopes missing them. Sync mode with sync_delete also deletes entries
+    that are not in the input. Per-entry results are written to a CSV. Returns the counts,
+    or None if the existing entries could not be fetched, in which case nothing is sent.
+    """
+    logger = logging.getLogger()
+    batch_size = get_batch_size()
+
+    async def create(session, scope_batch):
+        batch_scope_ids, batch = scope_batch
+        created = await create_scoped_entries(
+            session,
+            endpoint,
+            scope_filter(scope, list(batch_scope_ids)),
+            [entry for _, entry in batch],
+        )
+        for (line_number, _), (entry, status, error) in zip(batch, created):
+            report("create", line_number, entry, batch_scope_ids, status, error)
+        logger.info(
+            "Created %d %s entries so far, %d failed",
+            counts["created"],
+            label,
+            counts["failed"],
+        )
+
+    def report(action, line_number, entry, batch_scope_ids, status, error):
+        if status != 200:
+            counts["failed"] += 1
+            logger.error(
+                "Failed to %s %s entry for %s Error code: %s Description: %s",
+                action,
+                label,
+                entry["value"],
+                status,
+                error,
+            )
+        else:
+            counts[f"{action}d"] += 1
+        results.write(
+            {
+                "Row": line_number,
+                "Action": action,
+                "Value": entry["value"],
+                "Type": entry["type"],
+                "OS Type": entry["osType"],
+                "Scope IDs": ",".join(batch_scope_ids),
+                "HTTP Status": status,
+                "Error": error,
+            }
+        )
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            creates = {tuple(scope_ids): entries}
+            removed = []
+            if sync_mode:
+                logger.info("Fetching existing %s entries for %s", label, scope_ids)
+                try:
+                    existing = await fetch_scoped_entries(
+                        session, endpoint, list_params, scope, scope_ids
+                    )
+                except PaginationError:
+                    # Planning from a partial list would re-create entries that exist
+                    logger.error(
+                        "Could not fetch the existing %s entries, nothing was imported",
+                        label,
+                    )
+                    return False
+                creates, unchanged, removed = plan_scoped_sync(
+                    entries, existing, scope_ids
+                )
+                logger.info(
+                    "%d entries already present, %d to create, %d not in the input",
+                    unchanged,
+                    sum(len(x) for x in creates.values()),
+                    len(removed),
+                )
+                if not sync_delete:
+                    removed = []
+
+            batches = []
+            for batch_scope_ids, scoped_entries in creates.items():
+                groups = {}
+                for line_number, entry in scoped_entries:
+                    groups.setdefault((entry["osType"], entry["type"]), []).append(
+                        (line_number, entry)
+                    )
+                for group in groups.values():
+                    for i in range(0, len(group), batch_size):
+                        batches.append((batch_scope_ids, group[i : i + batch_size]))
+            logger.info("Sending %d create batch(es)", len(batches))
+            await gather_bounded(lambda batch: create(session, batch), batches)
+
+            if removed:
+                logger.info("Deleting %d %s entries", len(removed), label)
+                scope_by_id = {item["id"]: scope_id for scope_id, item in removed}
+                for item, status, error in await delete_scoped_entries(
+                    session, endpoint, [item for _, item in removed]
+                ):
+                    report(
+                        "delete", "", item, (scope_by_id[item["id"]],), status, error
+                    )
+            return True
+
+    counts = {"created": 0, "deleted": 0, "failed": 0}
+    results = ResultsFile(
+        f"Import_{label}",
+        [
+            "Row",
+            "Action",
+            "Value",
+            "Type",
+            "OS Type",
+            "Scope IDs",
+            "HTTP Status",
+            "Error",
+        ],
+    )
+    try:
+        completed = run_async(run())
+    finally:
+        results.close()
+    logger.info("Results written to %s", results.csv_filename)
+    return counts if completed else None
+
+
 # Tool operation functions
 def export_from_dv():
     """Function to export events from Deep Visibility by DV query ID"""
@@ -671,141 +2253,279 @@ def upgrade_from_csv(just_packages):
     logger = logging.getLogger()
     logger.addHandler(text_handler)
 
-    datestamp = datetime.datetime.now().strftime("%Y-%m-%d_%f")
-    csv_filename = f"Available_Packages_List_{datestamp}.csv"
+    async def catalog():
+        async with aiohttp.ClientSession() as session:
+            return await get_package_catalog(session)
 
     logger.debug("Just packages set to: %s", just_packages)
     if just_packages:
-        params = f"/web/api/{API_VERSION}/update/agent/packages?sortBy=updatedAt&sortOrder=desc&countOnly=false&{QUERY_LIMITS}"
-        url = HOSTNAME.get() + params
-        csv_file = csv.writer(open(csv_filename, "a+", newline="", encoding="utf-8"))
-        csv_file.writerow(
-            [
-                "Name",
-                "ID",
-                "Version",
-                "OS Type",
-                "OS Arch",
-                "Package Type",
-                "File Extension",
-                "Status",
-                "Scope Level",
-            ]
+        packages = run_async(catalog())
+        if packages is None:
+            return
+        datestamp = datetime.datetime.now().strftime("%Y-%m-%d_%f")
+        output_file = write_rows(
+            itertools.chain(
+                [[column for column, _ in PACKAGE_EXPORT_FIELDS]],
+                (
+                    [
+                        get_field_value(package, field)
+                        for _, field in PACKAGE_EXPORT_FIELDS
+                    ]
+                    for package in packages
+                ),
+            ),
+            "csv",
+            f"Available_Packages_List_{datestamp}",
+            "Packages",
+        )
+        logger.info("SentinelOne agent packages list written to: %s", output_file)
+        return
+
+    async def upgrade(session, package_id, agent_ids):
+        status, body = await api_request(
+            session,
+            "POST",
+            "/agents/actions/update-software",
+            payload={
+                "filter": {"ids": agent_ids},
+                "data": {
+                    "packageId": package_id,
+                    "isScheduled": USE_SCHEDULE.get(),
+                },
+            },
+        )
+        if status != 200:
+            logger.error(
+                "Failed to upgrade %d endpoints to package %s Error code: %s Description: %s",
+                len(agent_ids),
+                package_id,
+                status,
+                body,
+            )
+            write_names(package_id, agent_ids, {"HTTP Status": status, "Error": body})
+            return
+        affected = body["data"]["affected"]
+        logger.info(
+            "Sent upgrade command to %s endpoints for package %s", affected, package_id
+        )
+        write_names(
+            package_id, agent_ids, {"HTTP Status": status, "Batch Affected": affected}
         )
 
-        while url:
-            response = requests.get(
-                url,
-                headers=headers,
-                proxies={"http": PROXY.get(), "https": PROXY.get()},
-                verify=USE_SSL.get(),
+    def write_names(package_id, agent_ids, outcome):
+        # One row per input name, so each name can be traced to its agents and package
+        ids_by_name = {}
+        for agent_id in agent_ids:
+            ids_by_name.setdefault(agent_names[agent_id], []).append(agent_id)
+        for name, ids in ids_by_name.items():
+            results.write(
+                {
+                    "Input Name": name,
+                    "Resolved IDs": ",".join(ids),
+                    "Package ID": package_id,
+                    **outcome,
+                }
             )
-            logger.debug(
-                "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                url,
-                headers,
-                PROXY.get(),
-                USE_SSL.get(),
+
+    async def run(names):
+        async with aiohttp.ClientSession() as session:
+            packages, agents_by_name = await asyncio.gather(
+                get_package_catalog(session), fetch_agents_by_name(session, names)
             )
-            if response.status_code != 200:
-                logger.error(
-                    "Status: %s Problem with the request. Details - %s",
-                    str(response.status_code),
-                    str(response.text),
+            if packages is None:
+                # The catalog is only needed to pick packages, a given Package ID is sent as is
+                if not package_id:
+                    logger.error(
+                        "No upgrades were sent, the package list is incomplete"
+                    )
+                    return
+                logger.warning(
+                    "Sending package %s without checking it against the package list",
+                    package_id,
                 )
-            else:
-                data = response.json()
-                cursor = data["pagination"]["nextCursor"]
-                data = data["data"]
-                if data:
-                    for data in data:
-                        csv_file.writerow(
-                            [
-                                [data["fileName"]],
-                                data["id"],
-                                data["version"],
-                                data["osArch"],
-                                data["osType"],
-                                data["packageType"],
-                                data["fileExtension"],
-                                data["status"],
-                                data["scopeLevel"],
-                            ]
-                        )
-                if cursor:
-                    paramsnext = f"/web/api/{API_VERSION}/update/agent/packages?sortBy=updatedAt&sortOrder=desc&{QUERY_LIMITS}&cursor={cursor}&countOnly=false"
-                    url = HOSTNAME.get() + paramsnext
-                    logger.debug("Found next cursor: %s", cursor)
-                else:
-                    logger.debug("No cursor found, setting URL to None")
-                    url = None
-        logger.info("SentinelOne agent packages list written to: %s", csv_filename)
-    else:
-        with open(INPUT_FILE.get(), encoding="utf-8") as csv_file:
-            logger.debug("Reading CSV: %s", INPUT_FILE.get())
-            csv_reader = csv.reader(csv_file, delimiter=",")
-            line_count = 0
-            logger.debug("Use Schedule value: %s", USE_SCHEDULE.get())
-            for row in csv_reader:
-                logger.info("Upgrading endpoint named - %s", row[0])
-                url = (
-                    HOSTNAME.get()
-                    + f"/web/api/{API_VERSION}/agents/actions/update-software"
+                packages = []
+            planned, skipped = plan_package_upgrades(
+                agents_by_name, packages, package_id, version
+            )
+            for name in names:
+                if name not in agents_by_name:
+                    skipped.append((name, "Could not look up this name"))
+            for name, agents in agents_by_name.items():
+                for agent in agents:
+                    agent_names[agent["id"]] = name
+            for name, reason in skipped:
+                logger.info("Skipping %s - %s", name, reason)
+                results.write(
+                    {
+                        "Input Name": name,
+                        "Resolved IDs": ",".join(
+                            agent["id"] for agent in agents_by_name.get(name, [])
+                        ),
+                        "Error": reason,
+                    }
                 )
-                body = {
-                    "filter": {"computerName": row[0]},
-                    "data": {
-                        "packageId": package_id_entry.get(),
-                        "isScheduled": USE_SCHEDULE.get(),
-                    },
-                }
-                response = requests.post(
-                    url,
-                    data=json.dumps(body),
-                    headers=headers,
-                    proxies={"http": PROXY.get(), "https": PROXY.get()},
-                    verify=USE_SSL.get(),
+            catalog = {package["id"]: package for package in packages}
+            agents_by_id = {
+                agent["id"]: agent
+                for agents in agents_by_name.values()
+                for agent in agents
+            }
+            targets = {
+                agent_id: (
+                    catalog.get(planned_id, {}).get("version"),
+                    agents_by_id[agent_id].get("agentVersion"),
                 )
-                logger.debug(
-                    "Calling API with the following:\nURL: %s\tHeaders: %s\tData: %s\tProxy: %s\tUse SSL: %s",
-                    url,
-                    headers,
-                    json.dumps(body),
-                    PROXY.get(),
-                    USE_SSL.get(),
+                for planned_id, agent_ids in planned.items()
+                for agent_id in agent_ids
+            }
+            waves = plan_upgrade_waves(planned, wave_size)
+            logger.info(
+                "Upgrading %d agents with %d package(s) in %d wave(s)",
+                len(targets),
+                len(planned),
+                len(waves),
+            )
+            gated = len(waves) > 1 and not USE_SCHEDULE.get()
+            if len(waves) > 1 and not gated:
+                logger.warning(
+                    "Scheduled upgrades do not start immediately, so waves are sent without health checks"
                 )
-                if response.status_code != 200:
+            for number, wave in enumerate(waves, 1):
+                logger.info(
+                    "Wave %d of %d: upgrading %d agents in %d request(s)",
+                    number,
+                    len(waves),
+                    sum(len(agent_ids) for _, agent_ids in wave),
+                    len(wave),
+                )
+                await gather_bounded(lambda batch: upgrade(session, *batch), wave)
+                if not gated or number == len(waves):
+                    continue
+                wave_ids = [agent_id for _, agent_ids in wave for agent_id in agent_ids]
+                if not await poll_wave(session, number, wave_ids, targets):
                     logger.error(
-                        "Failed to upgrade endpoint %s Error code: %s Description: %s",
-                        row[0],
-                        str(response.status_code),
-                        str(response.text),
-                    )
-                else:
-                    data = response.json()
-                    logger.info(
-                        "Sent upgrade command to %s endpoints", data["data"]["affected"]
+                        "Wave %d did not reach %d%% upgraded within %d minutes. The remaining %d wave(s) were not sent.",
+                        number,
+                        success_percent,
+                        wave_timeout,
+                        len(waves) - number,
                     )
-                    if USE_SCHEDULE.get():
-                        logger.info(
-                            "Upgrade should follow schedule defined in Management Console."
-                        )
-                line_count += 1
-            if line_count < 1:
-                logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
-            else:
-                logger.info("Finished! Processed %d lines.", line_count)
-
+                    for later_wave in waves[number:]:
+                        for batch_package_id, agent_ids in later_wave:
+                            write_names(
+                                batch_package_id,
+                                agent_ids,
+                                {
+                                    "Error": f"Not sent, wave {number} failed its health check"
+                                },
+                            )
+                    return
 
-def move_agents(just_groups):
-    """Function to move Agents using API"""
-    scroll_text = ScrolledText.ScrolledText(
-        master=MOVE_AGENTS_FRAME, state="disabled", height=10
-    )
-    scroll_text.configure(font=ST_FONT)
-    scroll_text.grid(row=13, column=0, pady=10)
-    text_handler = TextHandler(scroll_text)
-    logging.basicConfig(
+    async def poll_wave(session, number, wave_ids, targets):
+        deadline = time.monotonic() + wave_timeout * 60
+        chunks = [
+            wave_ids[i : i + AGENT_IDS_PER_QUERY]
+            for i in range(0, len(wave_ids), AGENT_IDS_PER_QUERY)
+        ]
+        while True:
+            await asyncio.sleep(UPGRADE_POLL_INTERVAL)
+            agents = {}
+
+            async def fetch(chunk):
+                params = {"ids": ",".join(chunk), "limit": 1000}
+                async for page in api_paginate(session, "/agents", params):
+                    for agent in page:
+                        agents[agent["id"]] = agent
+
+            await gather_bounded(fetch, chunks)
+            upgraded = sum(
+                agent_id in agents
+                and agents[agent_id].get("isActive")
+                and is_upgraded(agents[agent_id], *targets[agent_id])
+                for agent_id in wave_ids
+            )
+            inactive = sum(
+                agent_id in agents and not agents[agent_id].get("isActive")
+                for agent_id in wave_ids
+            )
+            logger.info(
+                "Wave %d: %d of %d agents upgraded and active, %d inactive",
+                number,
+                upgraded,
+                len(wave_ids),
+                inactive,
+            )
+            if upgraded * 100 >= success_percent * len(wave_ids):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+
+    package_id = package_id_entry.get().strip()
+    version = package_version_entry.get().strip()
+    wave_size, success_percent, wave_timeout = get_wave_settings()
+    logger.debug("Use Schedule value: %s", USE_SCHEDULE.get())
+    with open(INPUT_FILE.get(), encoding="utf-8") as csv_file:
+        logger.debug("Reading CSV: %s", INPUT_FILE.get())
+        names = list(
+            dict.fromkeys(row[0] for row in csv.reader(csv_file, delimiter=",") if row)
+        )
+    if not names:
+        logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
+        return
+    if RUNNING_UPGRADE:
+        logger.error("An upgrade is already running. Stop it or wait for it to finish.")
+        return
+
+    def finish(task):
+        RUNNING_UPGRADE.clear()
+        results.close()
+        if task.cancelled():
+            logger.warning("Upgrade stopped, waves that were not sent yet were skipped")
+        elif task.exception():
+            logger.error("Upgrade failed: %s", task.exception())
+        else:
+            if USE_SCHEDULE.get():
+                logger.info(
+                    "Upgrade should follow schedule defined in Management Console."
+                )
+            logger.info("Finished! Processed %d lines.", len(names))
+        logger.info("Results written to %s\n", results.csv_filename)
+
+    agent_names = {}
+    results = ResultsFile(
+        "Upgrade_Agents",
+        [
+            "Input Name",
+            "Resolved IDs",
+            "Package ID",
+            "HTTP Status",
+            "Batch Affected",
+            "Error",
+        ],
+    )
+    # Waves can wait up to the timeout between sends, so this runs without blocking the window
+    RUNNING_UPGRADE["task"] = run_in_background(run(names), finish)
+
+
+def stop_upgrade():
+    """Function to stop a running agent upgrade. Requests already sent are not undone."""
+    task = RUNNING_UPGRADE.get("task")
+    if not task:
+        logging.getLogger().info("No upgrade is running")
+        return
+    logging.getLogger().info("Stopping the upgrade...")
+    task.cancel()
+
+
+def move_agents(just_groups):
+    """Function to move Agents using API"""
+    scroll_text = ScrolledText.ScrolledText(
+        master=MOVE_AGENTS_FRAME, state="disabled", height=10
+    )
+    scroll_text.configure(font=ST_FONT)
+    scroll_text.grid(row=13, column=0, pady=10)
+    text_handler = TextHandler(scroll_text)
+    logging.basicConfig(
         filename=LOG_NAME,
         level=LOG_LEVEL,
         format=LOG_FORMAT,
@@ -815,126 +2535,202 @@ def move_agents(just_groups):
 
     if just_groups:
         logger.debug("Just move agents to groups: %s", just_groups)
-        params = f"/web/api/{API_VERSION}/groups?isDefault=false&limit=200&type=static&countOnly=false"
-        url = HOSTNAME.get() + params
-        csv_filename = "Group_To_ID_Map.csv"
-        csv_file = csv.writer(open(csv_filename, "a+", newline="", encoding="utf-8"))
-        csv_file.writerow(["Name", "ID", "Site ID", "Created By"])
-        while url:
-            response = requests.get(
-                url,
-                headers=headers,
-                proxies={"http": PROXY.get(), "https": PROXY.get()},
-                verify=USE_SSL.get(),
+
+        async def fetch_groups(session):
+            groups = []
+            params = {"isDefault": "false", "type": "static", "limit": 1000}
+            try:
+                async for page in api_paginate(
+                    session, "/groups", params, raise_on_error=True
+                ):
+                    groups.extend(page)
+            except PaginationError:
+                return None
+            return groups
+
+        async def run():
+            async with aiohttp.ClientSession() as session:
+                # One cursor chain across the account, site names come from the cached tree
+                return await asyncio.gather(
+                    fetch_groups(session), get_scope_tree(session)
+                )
+
+        groups, sites = run_async(run())
+        if groups is None:
+            logger.error(
+                "Could not get every group, Group_To_ID_Map.csv was not written"
             )
-            logger.debug(
-                "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                url,
-                headers,
-                PROXY.get(),
-                USE_SSL.get(),
+            return
+        if sites is None:
+            logger.warning("Site and account names are left empty")
+            sites = {}
+        csv_filename = write_rows(
+            itertools.chain(
+                [
+                    [
+                        "Name",
+                        "ID",
+                        "Site ID",
+                        "Site Name",
+                        "Account ID",
+                        "Account Name",
+                        "Created By",
+                    ]
+                ],
+                (
+                    [
+                        group["name"],
+                        group["id"],
+                        group["siteId"],
+                        *(
+                            sites.get(group["siteId"], {}).get(field)
+                            for field in ("name", "accountId", "accountName")
+                        ),
+                        group["creator"],
+                    ]
+                    for group in groups
+                ),
+            ),
+            "csv",
+            "Group_To_ID_Map",
+            "Groups",
+        )
+        logger.info(
+            "Added %d groups to the group mapping file %s", len(groups), csv_filename
+        )
+        return
+
+    async def move_to_site(session, site_id, agent_ids):
+        status, body = await api_request(
+            session,
+            "POST",
+            "/agents/actions/move-to-site",
+            payload={"filter": {"ids": agent_ids}, "data": {"targetSiteId": site_id}},
+        )
+        result = {
+            "Action": "move-to-site",
+            "Target ID": site_id,
+            "Agents": len(agent_ids),
+        }
+        if status != 200:
+            logger.error(
+                "Failed to transfer %d endpoints to site %s Error code: %s Description: %s",
+                len(agent_ids),
+                site_id,
+                status,
+                body,
             )
-            if response.status_code != 200:
-                logger.error(
-                    "Status: %s Problem with the request. Details - %s",
-                    str(response.status_code),
-                    str(response.text),
-                )
-            else:
-                data = response.json()
-                cursor = data["pagination"]["nextCursor"]
-                data = data["data"]
-                if data:
-                    for data in data:
-                        csv_file.writerow(
-                            [
-                                [data["name"]],
-                                data["id"],
-                                data["siteId"],
-                                data["creator"],
-                            ]
-                        )
-                if cursor:
-                    paramsnext = f"/web/api/{API_VERSION}/groups?isDefault=false&limit=200&type=static&cursor={cursor}&countOnly=false"
-                    url = HOSTNAME.get() + paramsnext
-                    logger.debug("Found next cursor: %s", cursor)
-                else:
-                    logger.debug("No cursor found, setting URL to None")
-                    url = None
-        logger.info("Added group mapping to the file %s", csv_filename)
-    else:
-        with open(INPUT_FILE.get(), encoding="utf-8") as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=",")
-            line_count = 0
-            for row in csv_reader:
-                logger.info("Moving endpoint name %s to Site ID %s", row[0], row[2])
-                url = (
-                    HOSTNAME.get()
-                    + f"/web/api/{API_VERSION}/agents/actions/move-to-site"
-                )
-                body = {
-                    "filter": {"computerName": row[0]},
-                    "data": {"targetSiteId": row[2]},
-                }
-                response = requests.post(
-                    url,
-                    data=json.dumps(body),
-                    headers=headers,
-                    proxies={"http": PROXY.get(), "https": PROXY.get()},
-                    verify=USE_SSL.get(),
-                )
-                logger.debug(
-                    "Calling API with the following:\nURL: %s\tHeaders: %s\tData: %s\tProxy: %s\tUse SSL: %s",
-                    url,
-                    headers,
-                    json.dumps(body),
-                    PROXY.get(),
-                    USE_SSL.get(),
-                )
-                if response.status_code != 200:
-                    logger.error(
-                        "Failed to transfer endpoint %s to site %s Error code: %s Description: %s",
-                        row[0],
-                        row[2],
-                        str(response.status_code),
-                        str(response.text),
-                    )
-                    continue
-                else:
-                    data = response.json()
-                    logger.info("Moved %s endpoints", data["data"]["affected"])
-                logger.info("Moving endpoint name %s to Group ID %s", row[0], row[1])
-                url = (
-                    HOSTNAME.get()
-                    + f"/web/api/{API_VERSION}/groups/"
-                    + row[1]
-                    + "/move-agents"
-                )
-                body = {"filter": {"computerName": row[0]}}
-                response = requests.put(
-                    url,
-                    data=json.dumps(body),
-                    headers=headers,
-                    proxies={"http": PROXY.get(), "https": PROXY.get()},
-                    verify=USE_SSL.get(),
-                )
-                if response.status_code != 200:
-                    logger.error(
-                        "Failed to transfer endpoint %s to group %s Error code: %s Description: %s",
-                        row[0],
-                        row[1],
-                        str(response.status_code),
-                        str(response.text),
-                    )
-                    continue
-                else:
-                    data = response.json()
-                    logger.info("Moved %s endpoints", data["data"]["agentsMoved"])
-                line_count += 1
-            if line_count < 1:
-                logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
-            else:
-                logger.info("Finished! Processed %d lines.", line_count)
+            results.write({**result, "HTTP Status": status, "Error": body})
+            return
+        logger.info("Moved %s endpoints to site %s", body["data"]["affected"], site_id)
+        results.write(
+            {**result, "HTTP Status": status, "Affected": body["data"]["affected"]}
+        )
+
+    async def move_to_group(session, group_id, agent_ids):
+        status, body = await api_request(
+            session,
+            "PUT",
+            f"/groups/{group_id}/move-agents",
+            payload={"filter": {"ids": agent_ids}},
+        )
+        result = {
+            "Action": "move-agents",
+            "Target ID": group_id,
+            "Agents": len(agent_ids),
+        }
+        if status != 200:
+            logger.error(
+                "Failed to transfer %d endpoints to group %s Error code: %s Description: %s",
+                len(agent_ids),
+                group_id,
+                status,
+                body,
+            )
+            results.write({**result, "HTTP Status": status, "Error": body})
+            return
+        logger.info(
+            "Moved %s endpoints to group %s", body["data"]["agentsMoved"], group_id
+        )
+        results.write(
+            {**result, "HTTP Status": status, "Affected": body["data"]["agentsMoved"]}
+        )
+
+    def batches(targets):
+        return [
+            (target_id, agent_ids[i : i + AGENT_IDS_PER_ACTION])
+            for target_id, agent_ids in targets.items()
+            for i in range(0, len(agent_ids), AGENT_IDS_PER_ACTION)
+        ]
+
+    async def resolve(names):
+        async with aiohttp.ClientSession() as session:
+            return await resolve_agent_names(session, names)
+
+    async def run(worker, planned):
+        async with aiohttp.ClientSession() as session:
+            await gather_bounded(lambda batch: worker(session, *batch), planned)
+
+    with open(INPUT_FILE.get(), encoding="utf-8") as csv_file:
+        rows = []
+        for row in csv.reader(csv_file, delimiter=","):
+            if len(row) < 3:
+                if row:
+                    logger.error("Skipping row without a group and site ID: %s", row)
+                continue
+            rows.append(tuple(x.strip() for x in row[:3]))
+    if not rows:
+        logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
+        return
+
+    names = list(dict.fromkeys(row[0] for row in rows))
+    agent_ids = {}
+    if move_use_local_index.get():
+        agent_ids = lookup_local_agent_ids("computerName", names)
+        logger.info(
+            "Resolved %d of %d endpoint names from the local agent index",
+            len(agent_ids),
+            len(names),
+        )
+    unresolved = [name for name in names if name not in agent_ids]
+    if unresolved:
+        logger.info("Getting endpoint IDs for %d name(s)", len(unresolved))
+        agent_ids.update(run_async(resolve(unresolved)))
+    for name in names:
+        if agent_ids.get(name) == []:
+            logger.info(
+                "Could not locate any IDs for endpoint named %s - Please note the query is CaSe SenSiTiVe",
+                name,
+            )
+    if PREFLIGHT.get() and not confirm_preflight(
+        "Move_Agents",
+        names,
+        [len(agent_ids[name]) if name in agent_ids else None for name in names],
+        "agents",
+    ):
+        return
+
+    sites, groups = plan_agent_moves(rows, agent_ids)
+    site_batches = batches(sites)
+    group_batches = batches(groups)
+    logger.info(
+        "Moving agents to %d site(s) and %d group(s) in %d request(s)",
+        len(sites),
+        len(groups),
+        len(site_batches) + len(group_batches),
+    )
+    results = ResultsFile(
+        "Move_Agents",
+        ["Action", "Target ID", "Agents", "HTTP Status", "Affected", "Error"],
+    )
+    try:
+        # Groups belong to a site, so every site move finishes before the group moves start
+        run_async(run(move_to_site, site_batches))
+        run_async(run(move_to_group, group_batches))
+    finally:
+        results.close()
+    logger.info("Finished! Processed %d lines.", len(rows))
+    logger.info("Results written to %s\n", results.csv_filename)
 
 
 def assign_customer_id():
@@ -1008,8 +2804,8 @@ def assign_customer_id():
             logger.info("Finished! Processed %d lines.", line_count)
 
 
-def export_all_agents():
-    """Function to export a list of all Agents and details to CSV"""
+def export_all_agents(full_inventory):
+    """Function to export a list of all Agents and details to CSV, XLSX, JSONL or SQLite"""
     scroll_text = ScrolledText.ScrolledText(
         master=EXPORT_ENDPOINTS_FRAME, state="disabled", height=10
     )
@@ -1026,8 +2822,87 @@ def export_all_agents():
 
     datestamp = datetime.datetime.now().strftime("%Y-%m-%d_%f")
     output_file_name = f"Export_Endpoints_{datestamp}"
-    csv_filename = output_file_name + ".csv"
-    xlsx_file = output_file_name + ".xlsx"
+    output_type = endpoints_output_type.get()
+    logger.debug("User selected %s output type", output_type)
+
+    async def export_inventory(sink, fields, shard_by):
+        # Returns the shards that failed, so a truncated export is never reported as done
+        async with aiohttp.ClientSession() as session:
+            if shard_by == "siteIds":
+                shard_values = []
+                try:
+                    async for data in api_paginate(
+                        session, "/sites", {"limit": 1000}, raise_on_error=True
+                    ):
+                        shard_values.extend(site["id"] for site in data["sites"])
+                except PaginationError:
+                    logger.error("Could not list every site to shard the export by")
+                    return ["sites"]
+            elif shard_by == "osTypes":
+                shard_values = list(AGENT_OS_TYPES)
+            else:
+                shard_values = [None]
+            logger.info("Exporting agents across %d shard(s)", len(shard_values))
+
+            async def export_shard(shard_value):
+                params = {"limit": 1000}
+                if shard_value:
+                    params[shard_by] = shard_value
+                total = 0
+                try:
+                    async for agents in api_paginate(
+                        session, "/agents", params, raise_on_error=True
+                    ):
+                        for agent in agents:
+                            sink.write(
+                                [get_field_value(agent, field) for field in fields]
+                            )
+                        total += len(agents)
+                except PaginationError:
+                    logger.error(
+                        "Export of shard %s stopped after %d agents",
+                        shard_value or "all",
+                        total,
+                    )
+                    return shard_value or "all"
+                logger.info(
+                    "Exported %d agents for shard %s", total, shard_value or "all"
+                )
+                return None
+
+            failed = await gather_bounded(export_shard, shard_values)
+            return [shard for shard in failed if shard]
+
+    if full_inventory:
+        fields = [x.strip() for x in agent_fields_entry.get().split(",") if x.strip()]
+        shard_by = agent_shard_type.get()
+        if not fields:
+            logger.error("Must input one or more agent fields to export.")
+            return
+        logger.info(
+            "Starting full inventory export of %d field(s), sharded by %s",
+            len(fields),
+            shard_by,
+        )
+        sink = RowSink(
+            "csv" if output_type == "raw" else output_type,
+            output_file_name,
+            "Endpoints",
+            fields,
+        )
+        try:
+            failed = run_async(export_inventory(sink, fields, shard_by))
+        finally:
+            output_file = sink.close()
+        if failed:
+            logger.error(
+                "Export failed! %s is incomplete, these shard(s) did not finish: %s\n",
+                output_file,
+                ", ".join(failed),
+            )
+            return
+        logger.info("Done! Output file is - %s.\n", output_file)
+        return
 
     url = HOSTNAME.get() + f"/web/api/{API_VERSION}/export/agents-light"
 
@@ -1050,33 +2925,65 @@ def export_all_agents():
         )
         download.raise_for_status()
 
-        logger.info("Writing to %s", csv_filename)
-        with open(csv_filename, mode="wb") as new_file:
-            for chunk in download.iter_content(chunk_size=1024 * 1024):
-                logger.debug(
-                    "Writing chunk: %s", chunk
-                )  # Super-noisy, only uncomment if absolutely necessary for troubleshooting.
-                new_file.write(chunk)
-
-    logger.info("Creating new XLSX: %s", xlsx_file)
-    workbook = Workbook(xlsx_file)
-    logger.debug("Adding new worksheet: 'Endpoints'")
-    worksheet = workbook.add_worksheet("Endpoints")
-    if os.path.isfile(csv_filename):
-        with open(csv_filename, "r", encoding="utf8") as csv_file:
-            logger.info("Reading %s and writing to %s", csv_filename, xlsx_file)
-            reader = csv.reader(csv_file)
-            for r_idx, row in enumerate(reader):
-                for c_idx, col in enumerate(row):
-                    worksheet.write(r_idx, c_idx, col)
-        logger.debug("Deleting %s", csv_filename)
-        os.remove(csv_filename)
-    else:
-        logger.error("%s not found.", csv_filename)
-    logger.debug("Closing XLSX")
-    workbook.close()
+        if output_type == "raw":
+            output_file = output_file_name + ".csv"
+            logger.info("Writing raw export to %s", output_file)
+            with open(output_file, mode="wb") as new_file:
+                for chunk in download.iter_content(chunk_size=1024 * 1024):
+                    new_file.write(chunk)
+        else:
+            # Decode and parse the CSV as it arrives, re-adding the line endings so
+            # quoted fields spanning multiple lines are rebuilt by the CSV reader.
+            download.encoding = "utf-8-sig"
+            lines = (
+                line + "\n"
+                for line in download.iter_lines(
+                    chunk_size=1024 * 1024, decode_unicode=True
+                )
+            )
+            rows = (row for row in csv.reader(lines) if row)
+            output_file = write_rows(rows, output_type, output_file_name, "Endpoints")
+
+    logger.info("Done! Output file is - %s.\n", output_file)
+
+
+def sync_agent_inventory():
+    """Function to incrementally sync the Agent inventory into the local SQLite database"""
+    scroll_text = ScrolledText.ScrolledText(
+        master=EXPORT_ENDPOINTS_FRAME, state="disabled", height=10
+    )
+    scroll_text.configure(font=ST_FONT)
+    scroll_text.grid(row=13, column=0, columnspan=2, pady=10)
+    text_handler = TextHandler(scroll_text)
+    logging.basicConfig(
+        filename=LOG_NAME,
+        level=LOG_LEVEL,
+        format=LOG_FORMAT,
+    )
+    logger = logging.getLogger()
+    logger.addHandler(text_handler)
 
-    logger.info("Done! Output file is - %s.\n", output_file_name)
+    async def sync(connection):
+        async with aiohttp.ClientSession() as session:
+            return await sync_local_dataset(session, connection, "agents")
+
+    logger.info("Syncing Agent inventory into %s", get_local_db_name())
+    connection = open_local_db()
+    try:
+        total = run_async(sync(connection))
+        active, decommissioned = connection.execute(
+            "SELECT SUM(deleted = 0), SUM(deleted = 1) FROM agents"
+        ).fetchone()
+    finally:
+        connection.close()
+    if total is None:
+        return
+    logger.info("Fetched %d new or changed agents", total)
+    logger.info(
+        "Done! Local inventory holds %d active and %d decommissioned agents.\n",
+        active or 0,
+        decommissioned or 0,
+    )
 
 
 def decommission_agents():
@@ -1095,98 +3002,108 @@ def decommission_agents():
     logger = logging.getLogger()
     logger.addHandler(text_handler)
 
-    with open(INPUT_FILE.get(), encoding="utf-8") as csv_file:
-        logger.debug("Reading CSV: %s", INPUT_FILE.get())
-        csv_reader = csv.reader(csv_file, delimiter=",")
-        line_count = 0
-        for row in csv_reader:
-            logger.info("Decommissioning Endpoint - %s", row[0])
-            logger.info("Getting endpoint ID for %s", row[0])
-            url = (
-                HOSTNAME.get()
-                + f"/web/api/{API_VERSION}/agents?countOnly=false&computerName={row[0]}&{QUERY_LIMITS}"
+    async def resolve(session, name):
+        logger.info("Getting endpoint ID for %s", name)
+        status, body = await api_request(
+            session,
+            "GET",
+            "/agents",
+            params={"countOnly": "false", "computerName": name, "limit": 1000},
+        )
+        if status != 200:
+            logger.error(
+                "Failed to get ID for endpoint %s Error code: %s Description: %s",
+                name,
+                status,
+                body,
             )
-            response = requests.get(
-                url,
-                headers=headers,
-                proxies={"http": PROXY.get(), "https": PROXY.get()},
-                verify=USE_SSL.get(),
+            results.write({"Input Name": name, "HTTP Status": status, "Error": body})
+            return
+        agent_ids = [item["id"] for item in body["data"]]
+        if not agent_ids:
+            logger.info(
+                "Could not locate any IDs for endpoint named %s - Please note the query is CaSe SenSiTiVe",
+                name,
             )
-            logger.debug(
-                "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                url,
-                headers,
-                PROXY.get(),
-                USE_SSL.get(),
+            results.write({"Input Name": name, "HTTP Status": status, "Affected": 0})
+        resolved_ids[name] = agent_ids
+
+    async def decommission(session, name):
+        agent_ids = resolved_ids[name]
+        result = {"Input Name": name, "Resolved IDs": ",".join(agent_ids)}
+        logger.info("Decommissioning Endpoint - %s", name)
+        status, body = await api_request(
+            session,
+            "POST",
+            "/agents/actions/decommission",
+            payload={"filter": {"ids": agent_ids}},
+        )
+        if status != 200:
+            logger.error(
+                "Failed to decommission endpoint %s Error code: %s Description: %s",
+                name,
+                status,
+                body,
+            )
+            results.write({**result, "HTTP Status": status, "Error": body})
+            return
+        affected_num_of_endpoints = body["data"]["affected"]
+        if affected_num_of_endpoints < 1:
+            logger.info("No endpoint matched the name %s", name)
+        elif affected_num_of_endpoints > 1:
+            logger.info(
+                "%s endpoints matched the name %s, all of them got decommissioned",
+                affected_num_of_endpoints,
+                name,
             )
-            if response.status_code != 200:
-                logger.error(
-                    "Failed to get ID for endpoint %s Error code: %s Description: %s",
-                    row[0],
-                    str(response.status_code),
-                    str(response.text),
-                )
-            else:
-                json_response = response.json()
-                totalitems = json_response["pagination"]["totalItems"]
-                logger.debug("Total items returned: %s", totalitems)
-                if totalitems < 1:
-                    logger.info(
-                        "Could not locate any IDs for endpoint named %s - Please note the query is CaSe SenSiTiVe",
-                        row[0],
-                    )
-                else:
-                    json_response = json_response["data"]
-                    uuidslist = []
-                    for item in json_response:
-                        uuidslist.append(item["id"])
-                        logger.info(
-                            "Found ID %s! Adding it to be decommissioned", item["id"]
-                        )
-                    url = (
-                        HOSTNAME.get()
-                        + f"/web/api/{API_VERSION}/agents/actions/decommission"
-                    )
-                    body = {"filter": {"ids": uuidslist}}
-                    response = requests.post(
-                        url,
-                        data=json.dumps(body),
-                        headers=headers,
-                        proxies={"http": PROXY.get(), "https": PROXY.get()},
-                        verify=USE_SSL.get(),
-                    )
-                    logger.debug(
-                        "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                        url,
-                        headers,
-                        PROXY.get(),
-                        USE_SSL.get(),
-                    )
-                    if response.status_code != 200:
-                        logger.error(
-                            "Failed to decommission endpoint %s Error code: %s Description: %s",
-                            row[0],
-                            str(response.status_code),
-                            str(response.text),
-                        )
-                    else:
-                        json_response = response.json()
-                        affected_num_of_endpoints = json_response["data"]["affected"]
-                        if affected_num_of_endpoints < 1:
-                            logger.info("No endpoint matched the name %s", row[0])
-                        elif affected_num_of_endpoints > 1:
-                            logger.info(
-                                "%s endpoints matched the name %s, all of them got decommissioned",
-                                affected_num_of_endpoints,
-                                row[0],
-                            )
-                        else:
-                            logger.info("Successfully decommissioned the endpoint")
-            line_count += 1
-        if line_count < 1:
-            logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
         else:
-            logger.info("Finished! Processed %d lines.", line_count)
+            logger.info("Successfully decommissioned the endpoint %s", name)
+        results.write(
+            {**result, "HTTP Status": status, "Affected": affected_num_of_endpoints}
+        )
+
+    async def run(worker, names):
+        async with aiohttp.ClientSession() as session:
+            await gather_bounded(lambda name: worker(session, name), names)
+
+    with open(INPUT_FILE.get(), encoding="utf-8") as csv_file:
+        logger.debug("Reading CSV: %s", INPUT_FILE.get())
+        # A repeated name would otherwise be decommissioned and reported twice
+        names = list(
+            dict.fromkeys(row[0] for row in csv.reader(csv_file, delimiter=",") if row)
+        )
+
+    resolved_ids = {}
+    if decommission_use_local_index.get():
+        resolved_ids = lookup_local_agent_ids("computerName", names)
+        logger.info(
+            "Resolved %d of %d endpoint names from the local agent index",
+            len(resolved_ids),
+            len(names),
+        )
+
+    if not names:
+        logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
+        return
+    results = ResultsFile("Decommission_Agents", RESULT_COLUMNS)
+    try:
+        # Resolve every name up front so the preflight reports exactly which agents match
+        run_async(
+            run(resolve, dict.fromkeys(x for x in names if x not in resolved_ids))
+        )
+        matched = [x for x in names if resolved_ids.get(x)]
+        if PREFLIGHT.get() and not confirm_preflight(
+            "Decommission_Agents",
+            names,
+            [len(resolved_ids[x]) if x in resolved_ids else None for x in names],
+            "agents",
+        ):
+            return
+        run_async(run(decommission, matched))
+    finally:
+        results.close()
+    logger.info("Finished! Processed %d lines.", len(names))
+    logger.info("Results written to %s\n", results.csv_filename)
 
 
 def export_exclusions():
@@ -1876,55 +3793,67 @@ def manage_endpoint_tags():
 
     with open(INPUT_FILE.get()) as csv_file:
         logger.debug("Reading CSV: %s", INPUT_FILE.get())
-        csv_reader = csv.reader(csv_file, delimiter=",")
-        line_count = 0
+        rows = [row for row in csv.reader(csv_file, delimiter=",") if row]
+    if PREFLIGHT.get():
 
-        for row in csv_reader:
-            logger.info("Updating Endpoint Tags for %s", row[0])
-            url = HOSTNAME.get() + f"/web/api/{API_VERSION}/agents/actions/manage-tags"
-            body = {
-                "filter": {id_type: row[0]},
-                "data": [
-                    {
-                        "operation": endpoint_tags_action.get(),
-                        "tagId": tag_id_entry.get(),
-                    }
-                ],
-            }
-            logger.debug(
-                "Calling API with the following:\nURL: %s\tData: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                url,
-                json.dumps(body),
-                headers,
-                PROXY.get(),
-                USE_SSL.get(),
-            )
-            response = requests.post(
-                url,
-                data=json.dumps(body),
-                headers=headers,
-                proxies={"http": PROXY.get(), "https": PROXY.get()},
-                verify=USE_SSL.get(),
-            )
-            if response.status_code != 200:
-                logger.error(
-                    "Failed to update Endpoint Tag for agent %s Error code: %s Description: %s",
-                    row[0],
-                    str(response.status_code),
-                    str(response.text).strip(),
+        async def preflight():
+            async with aiohttp.ClientSession() as session:
+                return await count_each(
+                    session, "/agents", [{id_type: row[0]} for row in rows]
                 )
-            else:
-                r = response.json()
-                affected_num_of_endpoints = r["data"]["affected"]
-                if affected_num_of_endpoints < 1:
-                    logger.info("Endpoint Tag not updated for agent %s", row[0])
-                else:
-                    logger.info("Successfully updated the Endpoint Tag")
-            line_count += 1
-        if line_count < 1:
-            logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
+
+        counts = run_async(preflight())
+        if not confirm_preflight(
+            "Manage_Endpoint_Tags", [row[0] for row in rows], counts, "agents"
+        ):
+            return
+    line_count = 0
+    for row in rows:
+        logger.info("Updating Endpoint Tags for %s", row[0])
+        url = HOSTNAME.get() + f"/web/api/{API_VERSION}/agents/actions/manage-tags"
+        body = {
+            "filter": {id_type: row[0]},
+            "data": [
+                {
+                    "operation": endpoint_tags_action.get(),
+                    "tagId": tag_id_entry.get(),
+                }
+            ],
+        }
+        logger.debug(
+            "Calling API with the following:\nURL: %s\tData: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
+            url,
+            json.dumps(body),
+            headers,
+            PROXY.get(),
+            USE_SSL.get(),
+        )
+        response = requests.post(
+            url,
+            data=json.dumps(body),
+            headers=headers,
+            proxies={"http": PROXY.get(), "https": PROXY.get()},
+            verify=USE_SSL.get(),
+        )
+        if response.status_code != 200:
+            logger.error(
+                "Failed to update Endpoint Tag for agent %s Error code: %s Description: %s",
+                row[0],
+                str(response.status_code),
+                str(response.text).strip(),
+            )
         else:
-            logger.info("Finished! Processed %d lines.", line_count)
+            r = response.json()
+            affected_num_of_endpoints = r["data"]["affected"]
+            if affected_num_of_endpoints < 1:
+                logger.info("Endpoint Tag not updated for agent %s", row[0])
+            else:
+                logger.info("Successfully updated the Endpoint Tag")
+        line_count += 1
+    if line_count < 1:
+        logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
+    else:
+        logger.info("Finished! Processed %d lines.", line_count)
 
 
 def export_local_config():
@@ -1944,111 +3873,148 @@ def export_local_config():
     logger.addHandler(text_handler)
 
     datestamp = datetime.datetime.now().strftime("%Y-%m-%d_%f")
-    json_file = f"Local_Config_Export_{datestamp}.json"
 
     with open(INPUT_FILE.get()) as csv_file:
         logger.debug("Reading CSV: %s", INPUT_FILE.get())
-        csv_reader = csv.reader(csv_file, delimiter=",")
+        uuids = list(
+            dict.fromkeys(row[0].strip() for row in csv.reader(csv_file) if row)
+        )
+    if not uuids:
+        logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
+        return
+
+    async def resolve(session, chunk):
+        async for agents in api_paginate(
+            session, "/agents", {"limit": 1000, "uuids": ",".join(chunk)}
+        ):
+            for agent in agents:
+                found[agent["uuid"]] = agent
+
+    async def get_config(session, uuid):
+        agent = found[uuid]
+        logger.info("Getting Agent Config for Agent ID: %s", agent["id"])
+        status, body = await api_request(
+            session,
+            "GET",
+            f"/private/agents/{agent['id']}/support-actions/configuration",
+        )
+        if status != 200:
+            logger.error(
+                "Failed to get local config for Agent ID: %s Error code: %s Description: %s",
+                agent["id"],
+                status,
+                body,
+            )
+            return
+        agent_config = body["data"]
+        try:
+            if not isinstance(agent_config, dict):
+                agent_config = json.loads(agent_config)
+        except (TypeError, ValueError) as e:
+            logger.error("Failed to convert retrieved data: %s", e)
+            return
+        archive.write(
+            uuid,
+            {
+                "agentId": agent["id"],
+                "uuid": uuid,
+                "computerName": agent.get("computerName"),
+                "config": agent_config,
+            },
+        )
 
-        for row in csv_reader:
-            logger.info("Getting Agent ID for Agent UUID: %s", row[0])
-            url = HOSTNAME.get() + f"/web/api/{API_VERSION}/agents"
-            agent_id = ""
-            agent_config = ""
-            param = {"uuid": row[0]}
-            response = requests.get(
-                url,
-                params=param,
-                headers=headers,
-                proxies={"http": PROXY.get(), "https": PROXY.get()},
-                verify=USE_SSL.get(),
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            logger.info("Getting Agent IDs for %d Agent UUIDs", len(uuids))
+            # Keep each filtered request URL well under common proxy limits
+            await gather_bounded(
+                lambda chunk: resolve(session, chunk),
+                [uuids[i : i + 100] for i in range(0, len(uuids), 100)],
             )
-            logger.debug(
-                "Calling API with the following:\nURL: %s\tParams: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                url,
-                param,
-                headers,
-                PROXY.get(),
-                USE_SSL.get(),
+            for uuid in uuids:
+                if uuid not in found:
+                    logger.error("Failed to get details for Agent UUID: %s", uuid)
+            await gather_bounded(
+                lambda uuid: get_config(session, uuid),
+                [uuid for uuid in uuids if uuid in found],
             )
-            if response.status_code != 200:
-                logger.error(
-                    "Failed to get details for Agent UUID: %s Error code: %s Description: %s",
-                    row[0],
-                    str(response.status_code),
-                    str(response.text),
-                )
-                continue
-            else:
-                r = response.json()
-                agent_id = r["data"][0]["id"]
-                logger.info(
-                    "Successfully retrieved Agent ID: %s for Agent UUID: %s",
-                    agent_id,
-                    row[0],
-                )
 
-            logger.info("Getting Agent Config for Agent ID: %s", agent_id)
-            url = (
-                HOSTNAME.get()
-                + f"/web/api/{API_VERSION}/private/agents/{agent_id}/support-actions/configuration"
-            )
+    found = {}
+    archive = JsonArchive(
+        local_config_output_type.get(), f"Local_Config_Export_{datestamp}"
+    )
+    try:
+        run_async(run())
+    finally:
+        output_file = archive.close()
+    logger.info("Done! Output file is - %s\n", output_file)
 
-            response = requests.get(
-                url,
-                params={},
-                headers=headers,
-                proxies={"http": PROXY.get(), "https": PROXY.get()},
-                verify=USE_SSL.get(),
-            )
-            logger.debug(
-                "Calling API with the following:\nURL: %s\tParams: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                url,
-                param,
-                headers,
-                PROXY.get(),
-                USE_SSL.get(),
-            )
-            if response.status_code != 200:
-                logger.error(
-                    "Failed to get local config for Agent ID: %s Error code: %s Description: %s",
-                    agent_id,
-                    str(response.status_code),
-                    str(response.text),
-                )
-                continue
-            else:
-                r = response.json()
-                agent_config = r["data"]  # TODO TEST
-                logger.info(
-                    "Successfully retrieved local config for Agent ID: %s", agent_id
-                )
 
-            try:
-                if isinstance(agent_config, dict):
-                    with open(json_file, "a+", encoding="utf-8") as f:
-                        logger.info(
-                            "Writing local config for %s to %s", agent_id, json_file
-                        )
-                        f.write(f"\n{agent_id} - {row[0]}:\n")
-                        json.dump(agent_config, f, indent=4)
-                        f.write("\n")
-                    logger.info("Done! Output file is - %s\n", json_file)
-                else:
-                    formatted_data = json.loads(agent_config)
-                    with open(json_file, "a+", encoding="utf-8") as f:
-                        logger.info(
-                            "Writing local config for %s to %s", agent_id, json_file
-                        )
-                        f.write(f"\n{agent_id} - {row[0]}:\n")
-                        json.dump(formatted_data, f, indent=4)
-                        f.write("\n")
+def analyze_config_drift():
+    """Function to cluster exported agent local configs and report what differs per cluster"""
+    scroll_text = ScrolledText.ScrolledText(
+        master=EXPORT_LOCAL_CONFIG_FRAME, state="disabled", height=10
+    )
+    scroll_text.configure(font=ST_FONT)
+    scroll_text.grid(row=13, column=0, pady=10)
+    text_handler = TextHandler(scroll_text)
+    logging.basicConfig(
+        filename=LOG_NAME,
+        level=LOG_LEVEL,
+        format=LOG_FORMAT,
+    )
+    logger = logging.getLogger()
+    logger.addHandler(text_handler)
+
+    ignored = {x.strip() for x in drift_ignored_keys.get().split(",") if x.strip()}
+    logger.info("Loading agent configs from %s", INPUT_FILE.get())
+    started = time.perf_counter()
+    try:
+        clusters = cluster_configs(iter_json_archive(INPUT_FILE.get()), ignored)
+    except (OSError, ValueError, tarfile.TarError, zipfile.BadZipFile) as exc:
+        logger.error("Failed to read %s: %s", INPUT_FILE.get(), exc)
+        return
+    if not clusters:
+        logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
+        return
+    agent_count = sum(len(cluster["members"]) for cluster in clusters)
+    logger.info(
+        "%d agents in %d configuration cluster(s), analyzed in %.1f seconds",
+        agent_count,
+        len(clusters),
+        time.perf_counter() - started,
+    )
 
-                    logger.info("Done! Output file is - %s\n", json_file)
-            except TypeError as e:
-                logger.error("Failed to convert retrieved data: %s", e)
+    baseline = clusters[0]
+    diff_rows = [["Cluster", "Agents", "Key", "Baseline Value", "Cluster Value"]]
+    member_rows = [["Cluster", "Config Hash", "Agent ID", "UUID", "Computer Name"]]
+    for number, cluster in enumerate(clusters, start=1):
+        differences = diff_clusters(baseline, cluster)
+        logger.info(
+            "Cluster %d: %d agents, %d key(s) differ from the baseline cluster",
+            number,
+            len(cluster["members"]),
+            len(differences),
+        )
+        for key, base_value, value in differences:
+            diff_rows.append([number, len(cluster["members"]), key, base_value, value])
+        for member in cluster["members"]:
+            member_rows.append(
+                [
+                    number,
+                    cluster["hash"],
+                    member["agentId"],
+                    member["uuid"],
+                    member["computerName"],
+                ]
+            )
 
-        logger.info("Done!")
+    datestamp = datetime.datetime.now().strftime("%Y-%m-%d_%f")
+    diff_file = write_rows(diff_rows, "csv", f"Config_Drift_Keys_{datestamp}", "Drift")
+    member_file = write_rows(
+        member_rows, "csv", f"Config_Drift_Clusters_{datestamp}", "Clusters"
+    )
+    logger.info("Done! Output files are - %s and %s\n", diff_file, member_file)
 
 
 def export_users():
@@ -2231,136 +4197,68 @@ def export_roles():
     datestamp = datetime.datetime.now().strftime("%Y-%m-%d_%f")
     logger.debug("User selected %s file type", user_output_type.get())
     output_file_name = f"Export_Roles_{datestamp}"
-    csv_filename = f"{output_file_name}.csv"
-    xlsx_filename = f"{output_file_name}.xlsx"
-    role_url = (
-        HOSTNAME.get()
-        + f"/web/api/{API_VERSION}/rbac/roles?{QUERY_LIMITS}&sortOrder=asc&sortBy=name&includeChildren=true&includeParents=true"
-    )
-
-    col_names = [
-        "Account Name",
-        "Created At",
-        "Creator",
-        "Creator ID",
-        "Description",
-        "ID",
-        "Name",
-        "Pages",
-        "Predefined Role",
-        "Scope",
-        "Scope ID",
-        "Site Name",
-        "Updated At",
-        "Updated By",
-        "Updated By ID",
-        "Users In Roles",
-    ]
-
-    logger.info("Getting Roles list")
-    logger.debug(
-        "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-        role_url,
-        headers,
-        PROXY.get(),
-        USE_SSL.get(),
-    )
-    response = requests.get(
-        role_url,
-        headers=headers,
-        proxies={"http": PROXY.get(), "https": PROXY.get()},
-        verify=USE_SSL.get(),
-    )
-    if response.status_code != 200:
-        logger.error(
-            "Failed to get roles. Error code: %s Description: %s",
-            str(response.status_code),
-            str(response.text),
-        )
-    else:
-        role_data = response.json()
-
-    if role_data:
-        logger.info("Parsing data and populating list of Role IDs")
-        role_id_list = []
-        for role in role_data["data"]:
-            role_id_list.append(role.get("id", None))
-
-        logger.info(
-            "Looping through list of Role IDs to request Role Definitions for each."
-        )
-        rbac_data = []
-        for role_id in role_id_list:
-            if role_id:
-                rbac_url = (
-                    HOSTNAME.get() + f"/web/api/{API_VERSION}/rbac/role/{role_id}"
-                )
-                response = requests.get(
-                    rbac_url,
-                    headers=headers,
-                    proxies={"http": PROXY.get(), "https": PROXY.get()},
-                    verify=USE_SSL.get(),
-                )
-                logger.debug(
-                    "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                    rbac_url,
-                    headers,
-                    PROXY.get(),
-                    USE_SSL.get(),
-                )
-                if response.status_code != 200:
-                    logger.error(
-                        "Failed to get role details. Error code: %s Description: %s",
-                        str(response.status_code),
-                        str(response.text),
-                    )
-                else:
-                    response = response.json()
-                    rbac_data.append(response["data"])
 
-        with open(csv_filename, "w+", newline="", encoding="utf-8") as csv_file:
-            csv_writer = csv.DictWriter(csv_file, delimiter=",", fieldnames=col_names)
-            csv_writer.writeheader()
+    columns = {
+        "Account Name": "accountName",
+        "Created At": "createdAt",
+        "Creator": "creator",
+        "Creator ID": "creatorId",
+        "Description": "description",
+        "ID": "id",
+        "Name": "name",
+        "Pages": "pages",
+        "Predefined Role": "predefinedRole",
+        "Scope": "scope",
+        "Scope ID": "scopeId",
+        "Site Name": "siteName",
+        "Updated At": "updatedAt",
+        "Updated By": "updatedBy",
+        "Updated By ID": "updatedById",
+        "Users In Roles": "usersInRoles",
+    }
 
-            for role in rbac_data:
-                csv_writer.writerow(
-                    {
-                        "Account Name": role.get("accountName") or "N/A",
-                        "Created At": role.get("createdAt") or "N/A",
-                        "Creator": role.get("creator") or "N/A",
-                        "Creator ID": role.get("creatorId") or "N/A",
-                        "Description": role.get("description") or "N/A",
-                        "ID": role.get("id") or "N/A",
-                        "Name": role.get("name") or "N/A",
-                        "Pages": role.get("pages") or "N/A",
-                        "Predefined Role": role.get("predefinedRole") or "N/A",
-                        "Scope": role.get("scope") or "N/A",
-                        "Scope ID": role.get("scopeId") or "N/A",
-                        "Site Name": role.get("siteName") or "N/A",
-                        "Updated At": role.get("updatedAt") or "N/A",
-                        "Updated By": role.get("updatedBy") or "N/A",
-                        "Updated By ID": role.get("updatedById") or "N/A",
-                        "Users In Roles": role.get("usersInRoles") or "N/A",
-                    }
+    async def get_role(session, role_id):
+        status, body = await api_request(session, "GET", f"/rbac/role/{role_id}")
+        if status != 200:
+            logger.error(
+                "Failed to get role details. Error code: %s Description: %s",
+                status,
+                body,
+            )
+            return
+        role = body["data"]
+        row = []
+        for key in columns.values():
+            value = role.get(key) or "N/A"
+            row.append(str(value) if isinstance(value, (list, dict)) else value)
+        sink.write(row)
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            async for roles in api_paginate(
+                session,
+                "/rbac/roles",
+                {
+                    "limit": 1000,
+                    "sortOrder": "asc",
+                    "sortBy": "name",
+                    "includeChildren": "true",
+                    "includeParents": "true",
+                },
+            ):
+                role_ids = [role["id"] for role in roles if role.get("id")]
+                logger.info("Getting Role Definitions for %d roles", len(role_ids))
+                await gather_bounded(
+                    lambda role_id: get_role(session, role_id), role_ids
                 )
 
-        if user_output_type.get() == "xlsx" and os.path.exists(csv_filename):
-            workbook = Workbook(xlsx_filename)
-            worksheet = workbook.add_worksheet()
-            with open(csv_filename, "r", encoding="utf-8") as csv_file:
-                reader = csv.reader(csv_file)
-                for r, row in enumerate(reader):
-                    for c, col in enumerate(row):
-                        worksheet.write(r, c, col)
-            logger.debug("Closing XLSX")
-            workbook.close()
-
-            logger.debug("Deleting %s", csv_filename)
-            os.remove(csv_filename)
-
-    logger.info(
-        "Done! Output file is - %s.%s\n", output_file_name, user_output_type.get()
-    )
+    logger.info("Getting Roles list")
+    sink = RowSink(user_output_type.get(), output_file_name, "Roles", columns)
+    try:
+        run_async(run())
+    finally:
+        output_file = sink.close()
+    logger.info("Done! Output file is - %s\n", output_file)
 
 
 def export_ranger():
@@ -2387,6 +4285,7 @@ def export_ranger():
         scope_param = "accountIds"
     if not INPUT_FILE.get():
         logger.error("Must select a CSV containing Account or Site IDs")
+        return
 
     datestamp = datetime.datetime.now().strftime("%Y-%m-%d")
 
@@ -2398,73 +4297,159 @@ def export_ranger():
     )
     with open(f"{str(INPUT_FILE.get())}") as csv_file:
         logger.debug("Reading CSV: %s", INPUT_FILE.get())
-        csv_reader = csv.reader(csv_file, delimiter=",")
-        for row in csv_reader:
-            logger.info(
-                "Exporting Ranger Inventory for %s scope ID: %s",
-                export_scope.capitalize(),
-                row[0],
+        # Each scope ID is exported once, a repeat would reuse a closed output file
+        scope_ids = list(
+            dict.fromkeys(
+                row[0].strip() for row in csv.reader(csv_file) if row and row[0].strip()
             )
-            firstrun = True
-            endpoint = f"/web/api/{API_VERSION}/ranger/table-view?{QUERY_LIMITS}&period={ranger_time_period}&{scope_param}={row[0]}"
-            url = HOSTNAME.get() + endpoint
-            while url:
-                logger.debug(
-                    "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                    url,
-                    headers,
-                    PROXY.get(),
-                    USE_SSL.get(),
-                )
-                response = requests.get(
-                    url,
-                    headers=headers,
-                    proxies={"http": PROXY.get(), "https": PROXY.get()},
-                    verify=USE_SSL.get(),
+        )
+
+    merge = ranger_merge_output.get()
+    sinks = {}
+
+    def get_sink(scope_id, header):
+        key = "merged" if merge else scope_id
+        if key not in sinks:
+            if merge:
+                output_file_name = f"Ranger_Export-{export_scope.capitalize()}_{ranger_time_period}_{datestamp}"
+                header = ["Scope ID", *header]
+            else:
+                output_file_name = f"Ranger_Export-{export_scope.capitalize()}_{scope_id}_{ranger_time_period}_{datestamp}"
+            sinks[key] = RowSink("csv", output_file_name, "Ranger", header)
+        return sinks[key]
+
+    async def export_scope_id(session, scope_id):
+        logger.info(
+            "Exporting Ranger Inventory for %s scope ID: %s",
+            export_scope.capitalize(),
+            scope_id,
+        )
+        sink = None
+        total = 0
+        async for data in api_paginate(
+            session,
+            "/ranger/table-view",
+            {"limit": 1000, "period": ranger_time_period, scope_param: scope_id},
+        ):
+            if sink is None and data:
+                sink = get_sink(scope_id, list(data[0]))
+                # Merged output keeps the columns of the first scope that returned data
+                header = sink.header[1:] if merge else sink.header
+            for item in data:
+                row = [get_field_value(item, key) for key in header]
+                sink.write([scope_id, *row] if merge else row)
+            total += len(data)
+        if not total:
+            logger.info("No Ranger Inventory data returned for %s", scope_id)
+        else:
+            logger.info("Exported %d devices for %s", total, scope_id)
+            if not merge:
+                sinks.pop(scope_id).close()
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            await gather_bounded(
+                lambda scope_id: export_scope_id(session, scope_id), scope_ids
+            )
+
+    try:
+        run_async(run())
+    finally:
+        for sink in sinks.values():
+            sink.close()
+    logger.info("Done exporting Ranger Inventory.")
+
+
+def snapshot_ranger():
+    """Function to snapshot Ranger Inventory into the local database and report new,
+    changed and disappeared devices since the previous snapshot"""
+    scroll_text = ScrolledText.ScrolledText(
+        master=EXPORT_RANGER_INV_FRAME, state="disabled", height=10
+    )
+    scroll_text.configure(font=ST_FONT)
+    scroll_text.grid(row=13, column=0, columnspan=2, pady=10)
+    text_handler = TextHandler(scroll_text)
+    logging.basicConfig(
+        filename=LOG_NAME,
+        level=LOG_LEVEL,
+        format=LOG_FORMAT,
+    )
+    logger = logging.getLogger()
+    logger.addHandler(text_handler)
+
+    export_scope = export_ranger_scope.get()
+    ranger_time_period = export_ranger_timeperiod.get()
+    scope_param = "siteIds" if export_scope == "sites" else "accountIds"
+    if not INPUT_FILE.get():
+        logger.error("Must select a CSV containing Account or Site IDs")
+        return
+    with open(INPUT_FILE.get()) as csv_file:
+        logger.debug("Reading CSV: %s", INPUT_FILE.get())
+        scope_ids = list(
+            dict.fromkeys(
+                row[0].strip() for row in csv.reader(csv_file) if row and row[0].strip()
+            )
+        )
+
+    run_at = datetime.datetime.utcnow().isoformat()
+    report = [
+        ["Change", "Scope ID", "Identity", "First Seen", "Last Seen", "Changed Fields"]
+    ]
+    counts = {"new": 0, "changed": 0, "disappeared": 0}
+
+    async def snapshot_scope_id(session, scope_id):
+        devices = []
+        params = {"limit": 1000, "period": ranger_time_period, scope_param: scope_id}
+        while True:
+            status, body = await api_request(
+                session, "GET", "/ranger/table-view", params=params
+            )
+            if status != 200:
+                # A partial device list would report everything else as disappeared
+                logger.error(
+                    "Status: %s Problem with the request. Details - %s Snapshot for %s not updated.",
+                    status,
+                    body,
+                    scope_id,
                 )
-                if response.status_code != 200:
-                    logger.error(
-                        "Status: %s Problem with the request. Details - %s ",
-                        str(response.status_code),
-                        str(response.text),
-                    )
-                    break
-                else:
-                    data = response.json()
-                    cursor = data["pagination"]["nextCursor"]
-                    data = data["data"]
-                    if not data:
-                        logger.info("No Ranger Inventory data returned. Exiting")
-                        url = None
-                        continue
-                    else:
-                        csv_filename = f"Ranger_Export-{export_scope.capitalize()}_{row[0]}_{ranger_time_period}_{datestamp}.csv"
-                        logger.debug("Opening %s to write", csv_filename)
-                        f = csv.writer(
-                            open(csv_filename, "a+", newline="", encoding="utf-8")
-                        )
-                        if firstrun:
-                            tmp = []
-                            for key, value in data[0].items():
-                                tmp.append(key)
-                            logger.debug("Writing first row to %s", csv_filename)
-                            f.writerow(tmp)
-                            firstrun = False
-                        for item in data:
-                            tmp = []
-                            for key, value in item.items():
-                                tmp.append(value)
-                            logger.debug("Writing data to %s", csv_filename)
-                            f.writerow(tmp)
-                    if cursor:
-                        paramsnext = endpoint + f"&cursor={cursor}"
-                        url = HOSTNAME.get() + paramsnext
-                        logger.debug("Next cursor found, updating URL: %s", url)
-                    else:
-                        logger.debug("No cursor found, setting URL to None")
-                        url = None
-                logger.info("Finished writing to %s", csv_filename)
-        logger.info("Done exporting Ranger Inventory.")
+                return
+            devices.extend(body["data"])
+            if not body["pagination"]["nextCursor"]:
+                break
+            params["cursor"] = body["pagination"]["nextCursor"]
+        changes = apply_ranger_snapshot(connection, scope_id, devices, run_at)
+        for change in changes:
+            counts[change[0]] += 1
+            report.append([change[0], scope_id, *change[1:]])
+        logger.info(
+            "%s: %d devices, %d change(s) since the previous snapshot",
+            scope_id,
+            len(devices),
+            len(changes),
+        )
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            await gather_bounded(
+                lambda scope_id: snapshot_scope_id(session, scope_id), scope_ids
+            )
+
+    connection = open_local_db()
+    try:
+        run_async(run())
+    finally:
+        connection.close()
+    logger.info(
+        "%d new, %d changed and %d disappeared devices",
+        counts["new"],
+        counts["changed"],
+        counts["disappeared"],
+    )
+    datestamp = datetime.datetime.now().strftime("%Y-%m-%d_%f")
+    output_file = write_rows(
+        report, "csv", f"Ranger_Changes_{datestamp}", "Ranger Changes"
+    )
+    logger.info("Done! Output file is - %s\n", output_file)
 
 
 def export_account_ids():
@@ -2547,9 +4532,48 @@ def export_account_ids():
     logger.info("Done exporting Account IDs.")
 
 
-def bulk_resolve_threats():
-    """Function to resolve multiple incidents by threat detail string search or SHA1"""
-    # TODO: Test special chars
+def get_threat_filters():
+    """Function to build the threat filters from the Bulk Resolve Threats inputs: a threat
+    name, comma-separated SHA1s, or a CSV of SHA1s and threat names. Threats are matched
+    on SHA1 only, so other hashes are skipped with a warning."""
+    logger = logging.getLogger()
+    search_type = incident_search_type.get()
+    if search_type == "threat_name":
+        return build_threat_filters([incident_search_value.get()], [])
+    names = {}
+    hashes = {}
+    if search_type == "content_hash":
+        for value in incident_search_value.get().split(","):
+            value = value.strip().lower()
+            if SHA1_PATTERN.fullmatch(value):
+                hashes[value] = None
+            elif value:
+                logger.warning("Skipping %s, it is not a SHA1", value)
+        return build_threat_filters([], hashes)
+    with open(INPUT_FILE.get(), encoding="utf-8") as csv_file:
+        logger.debug("Reading CSV: %s", INPUT_FILE.get())
+        for row in csv.reader(csv_file):
+            value = row[0].strip() if row else ""
+            if SHA1_PATTERN.fullmatch(value.lower()):
+                hashes[value.lower()] = None
+            elif HASH_PATTERN.fullmatch(value.lower()):
+                logger.warning(
+                    "Skipping %s, threats can only be matched on SHA1", value
+                )
+            elif value:
+                names[value] = None
+    logger.info(
+        "Read %d SHA1s and %d threat names from %s",
+        len(hashes),
+        len(names),
+        INPUT_FILE.get(),
+    )
+    return build_threat_filters(names, hashes)
+
+
+def export_matching_threats():
+    """Function to export the unresolved threats matching the Bulk Resolve Threats inputs
+    for review before resolving them"""
     scroll_text = ScrolledText.ScrolledText(
         master=BULK_RESOLVE_THREATS_FRAME, state="disabled", height=10
     )
@@ -2564,232 +4588,142 @@ def bulk_resolve_threats():
     logger = logging.getLogger()
     logger.addHandler(text_handler)
 
-    GET_LIMIT = 1
-    POST_LIMIT = 2500  # Max per API Docs is 5000, in newer consoles
-    RESOLVED_STATUS = "resolved"
-    IS_RESOLVED = False
-    THREAT_ENDPOINT = "/threats"
-    NOTE_ENDPOINT = "/threats/notes"
-    INCIDENT_ENDPOINT = "/threats/incident"
-    PARTIAL_URL = f"{HOSTNAME.get()}/web/api/{API_VERSION}"
     site_ids = [x for x in site_ids_list.get().split(",")]
-    new_verdict = selected_analyst_verdict.get()
-    new_note = f"Analyst Verdict: '{new_verdict}'\nIncident Status: '{RESOLVED_STATUS}'\n\n- Set via S1 Manager."
-    search_value = incident_search_value.get()
-    multi_run = False
-    rsession = requests.Session()
-
-    logger.debug(
-        "Creating appropriate params/payload for Incident Search Type: %s",
-        incident_search_type.get(),
-    )
-    if incident_search_type.get() == "threat_name":
-        get_params = {
-            "limit": GET_LIMIT,
-            "siteIds": site_ids,
-            "resolved": IS_RESOLVED,
-            "threatDetails__contains": f'"{search_value}"',
-        }
-        add_note_payload = json.dumps(
-            {
-                "filter": {
-                    "limit": POST_LIMIT,
-                    "siteIds": site_ids,
-                    "resolved": IS_RESOLVED,
-                    "threatDetails__contains": f'"{search_value}"',
-                },
-                "data": {"text": new_note},
-            }
-        )
-        update_incident_payload = json.dumps(
-            {
-                "filter": {
-                    "limit": POST_LIMIT,
-                    "siteIds": site_ids,
-                    "resolved": IS_RESOLVED,
-                    "threatDetails__contains": f'"{search_value}"',
-                },
-                "data": {
-                    "incidentStatus": RESOLVED_STATUS,
-                    "analystVerdict": new_verdict,
-                },
-            }
-        )
-        logger.debug(
-            "get_params = %s\nadd_note_payload = %s\nupdate_incident_payload = %s",
-            get_params,
-            add_note_payload,
-            update_incident_payload,
-        )
-    else:
-        get_params = {
-            "limit": GET_LIMIT,
-            "siteIds": site_ids,
-            "resolved": IS_RESOLVED,
-            "contentHashes": search_value,
-        }
-        add_note_payload = json.dumps(
-            {
-                "filter": {
-                    "limit": POST_LIMIT,
-                    "siteIds": site_ids,
-                    "resolved": IS_RESOLVED,
-                    "contentHashes": search_value,
-                },
-                "data": {"text": new_note},
-            }
-        )
-        update_incident_payload = json.dumps(
-            {
-                "filter": {
-                    "limit": POST_LIMIT,
-                    "siteIds": site_ids,
-                    "resolved": IS_RESOLVED,
-                    "contentHashes": search_value,
-                },
-                "data": {
-                    "incidentStatus": RESOLVED_STATUS,
-                    "analystVerdict": new_verdict,
-                },
-            }
-        )
-        logger.debug(
-            "get_params = %s\nadd_note_payload = %s\nupdate_incident_payload = %s",
-            get_params,
-            add_note_payload,
-            update_incident_payload,
+    threat_filters = get_threat_filters()
+    if not threat_filters:
+        logger.error("No threat names or SHA1s to search for")
+        return
+    seen = set()
+
+    async def export(session, threat_filter):
+        params = filter_to_params(
+            {**threat_filter, "siteIds": site_ids, "resolved": False}
         )
+        async for threats in api_paginate(
+            session, "/threats", {**params, "limit": 1000}
+        ):
+            for threat in threats:
+                # A threat can match both a name and a hash filter
+                if threat["id"] in seen:
+                    continue
+                seen.add(threat["id"])
+                sink.write(
+                    [get_field_value(threat, field) for field in THREAT_EXPORT_FIELDS]
+                )
+        logger.info("Exported %d matching threats so far", len(seen))
 
-    logger.info(
-        "Checking for total number of unresolved incidents for: %s", search_value
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            await gather_bounded(
+                lambda threat_filter: export(session, threat_filter), threat_filters
+            )
+
+    datestamp = datetime.datetime.now().strftime("%Y-%m-%d_%f")
+    sink = RowSink(
+        "csv", f"Matching_Threats_{datestamp}", "Threats", THREAT_EXPORT_FIELDS
     )
+    try:
+        run_async(run())
+    finally:
+        output_file = sink.close()
+    logger.info("Done! Output file is - %s\n", output_file)
 
-    with rsession as new_session:
-        url = PARTIAL_URL + THREAT_ENDPOINT
-        response = new_session.get(
-            url=url,
-            headers=headers,
-            params=get_params,
-            proxies={"http": PROXY.get(), "https": PROXY.get()},
-            verify=USE_SSL.get(),
-        )
-        logger.debug(
-            "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-            url,
-            headers,
-            PROXY.get(),
-            USE_SSL.get(),
-        )
-        if response.status_code != 200:
-            logger.error(
-                "Status: %s Problem with the request. Details - %s ",
-                str(response.status_code),
-                str(response.text),
-            )
-        response.raise_for_status()
 
-        total_incidents = int(response.json()["pagination"]["totalItems"])
+def bulk_resolve_threats():
+    """Function to resolve multiple incidents by threat detail string search, SHA1s, or a
+    CSV of both"""
+    # TODO: Test special chars
+    scroll_text = ScrolledText.ScrolledText(
+        master=BULK_RESOLVE_THREATS_FRAME, state="disabled", height=10
+    )
+    scroll_text.configure(font=ST_FONT)
+    scroll_text.grid(row=13, column=0, columnspan=2, pady=10)
+    text_handler = TextHandler(scroll_text)
+    logging.basicConfig(
+        filename=LOG_NAME,
+        level=LOG_LEVEL,
+        format=LOG_FORMAT,
+    )
+    logger = logging.getLogger()
+    logger.addHandler(text_handler)
 
-    if not total_incidents:
-        logger.info(
-            "Total unresolved incidents is %d. Nothing to change.",
-            total_incidents,
-        )
-    else:
-        logger.info(
-            "Total unresolved incidents is %d. Starting to update and resolve incidents",
-            total_incidents,
-        )
-        multi_run = True
-
-    while multi_run:
-        logger.info("Adding '%s' as a note to threat incidents", new_note)
-        with rsession as new_session:
-            url = PARTIAL_URL + NOTE_ENDPOINT
-            response = new_session.post(
-                url=url,
-                headers=headers,
-                data=add_note_payload,
-                proxies={"http": PROXY.get(), "https": PROXY.get()},
-                verify=USE_SSL.get(),
-            )
-            logger.debug(
-                "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                url,
-                headers,
-                PROXY.get(),
-                USE_SSL.get(),
-            )
-            response.raise_for_status()
+    site_ids = [x for x in site_ids_list.get().split(",")]
+    new_verdict = selected_analyst_verdict.get()
+    threat_filters = get_threat_filters()
+    if not threat_filters:
+        logger.error("No threat names or SHA1s to search for")
+        return
+    logger.debug("Threat filters: %s", threat_filters)
+    targets = [
+        {**threat_filter, "siteIds": [site_id]}
+        for threat_filter in threat_filters
+        for site_id in site_ids
+    ]
 
+    progress = {"resolved": 0, "total": 0, "started": time.perf_counter()}
+
+    def report():
+        elapsed = time.perf_counter() - progress["started"]
         logger.info(
-            "Setting Analyst Verdict to '%s' and Incident Status to '%s'",
-            new_verdict,
-            RESOLVED_STATUS,
+            "Resolved %d of %d incidents, %d remaining (%.1f per second)",
+            progress["resolved"],
+            progress["total"],
+            max(progress["total"] - progress["resolved"], 0),
+            progress["resolved"] / elapsed if elapsed else 0,
         )
-        with rsession as new_session:
-            url = PARTIAL_URL + INCIDENT_ENDPOINT
-            response = new_session.post(
-                url=url,
-                headers=headers,
-                data=update_incident_payload,
-                proxies={"http": PROXY.get(), "https": PROXY.get()},
-                verify=USE_SSL.get(),
-            )
-            logger.debug(
-                "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                url,
-                headers,
-                PROXY.get(),
-                USE_SSL.get(),
-            )
-            if response.status_code != 200:
-                logger.error(
-                    "Status: %s Problem with the request. Details - %s ",
-                    str(response.status_code),
-                    str(response.text),
-                )
-            response.raise_for_status()
 
-        logger.info("Checking if there are more incidents to update")
-        with rsession as new_session:
-            url = PARTIAL_URL + THREAT_ENDPOINT
-            response = new_session.get(
-                url=url,
-                headers=headers,
-                params=get_params,
-                proxies={"http": PROXY.get(), "https": PROXY.get()},
-                verify=USE_SSL.get(),
-            )
-            logger.debug(
-                "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                url,
-                headers,
-                PROXY.get(),
-                USE_SSL.get(),
-            )
-            if response.status_code != 200:
-                logger.error(
-                    "Status: %s Problem with the request. Details - %s ",
-                    str(response.status_code),
-                    str(response.text),
-                )
-            response.raise_for_status()
+    progress["report"] = report
 
-            total_incidents = int(response.json()["pagination"]["totalItems"])
+    async def count():
+        async with aiohttp.ClientSession() as session:
+            return await count_each(
+                session,
+                "/threats",
+                [{**target, "resolved": False} for target in targets],
+            )
 
-        if not total_incidents:
-            logger.info(
-                "Total remaining unresolved incidents is '0', setting multi_run to False."
+    async def resolve(matched):
+        async with aiohttp.ClientSession() as session:
+            await gather_bounded(
+                lambda target: resolve_matching_threats(
+                    session, target, new_verdict, progress
+                ),
+                matched,
             )
-            multi_run = False
-        else:
+
+    logger.info(
+        "Checking for total number of unresolved incidents for %d filter(s) across %d site(s)",
+        len(threat_filters),
+        len(site_ids),
+    )
+    counts = run_async(count())
+    matched = [target for target, count in zip(targets, counts) if count]
+    progress["total"] = sum(count or 0 for count in counts)
+    if PREFLIGHT.get():
+        if len(threat_filters) > 1:
+            # countOnly per filter is cheap, the price is that overlaps are counted twice
             logger.info(
-                "Total remaining unresolved incidents is %d. Continuing to update and resolve incidents",
-                total_incidents,
+                "A threat matched by more than one name or SHA1 batch is counted once per match"
             )
-
-    logger.info("Done! Incidents resolved.\n")
+        if not confirm_preflight(
+            "Bulk_Resolve_Threats",
+            [json.dumps(target) for target in targets],
+            counts,
+            "incidents",
+        ):
+            return
+    elif not matched:
+        logger.info(
+            "Total unresolved incidents is %d. Nothing to change.", progress["total"]
+        )
+        return
+    logger.info(
+        "Total unresolved incidents is %d. Starting to update and resolve incidents",
+        progress["total"],
+    )
+    progress["started"] = time.perf_counter()
+    run_async(resolve(matched))
+    logger.info("Done! %d incidents resolved.\n", progress["resolved"])
 
 
 def update_sys_config():
@@ -2808,87 +4742,241 @@ def update_sys_config():
     logger = logging.getLogger()
     logger.addHandler(text_handler)
 
-    if not site_acct_ids_list.get():
+    async def fetch(session, new_id):
+        status, body = await api_request(
+            session, "GET", "/system/configuration", params={id_type: new_id}
+        )
+        if status != 200:
+            logger.error(
+                "Failed to get the current system configuration for %s Status: %s Details - %s",
+                new_id,
+                status,
+                body,
+            )
+            results.write({"ID": new_id, "HTTP Status": status, "Error": body})
+            return
+        current[new_id] = body["data"]
+
+    async def apply(session, new_id):
+        status, body = await api_request(
+            session, "PUT", "/system/configuration", payload=payloads[new_id]
+        )
+        result = {"ID": new_id, "Changed Keys": ",".join(payloads[new_id]["data"])}
+        if status != 200:
+            logger.error(
+                "Failed to update system configuration for %s Status: %s Details - %s",
+                new_id,
+                status,
+                body,
+            )
+            results.write({**result, "HTTP Status": status, "Error": body})
+            return False
+        logger.info("System configuration updated for %s", new_id)
+        results.write({**result, "HTTP Status": status})
+        return True
+
+    async def run(worker, stage):
+        async with aiohttp.ClientSession() as session:
+            return await gather_bounded(lambda new_id: worker(session, new_id), stage)
+
+    def save_snapshots(rows):
+        if not rows:
+            return
+        connection = open_local_db()
+        try:
+            connection.executemany(
+                "INSERT INTO sys_config_snapshots (run_at, id_type, scope_id, config, previous, console) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            connection.commit()
+        finally:
+            connection.close()
+        logger.info(
+            "Saved a snapshot of %d ID(s) to %s for rollback",
+            len(rows),
+            get_local_db_name(),
+        )
+
+    ids_list = list(
+        dict.fromkeys(
+            x.strip() for x in site_acct_ids_list.get().split(",") if x.strip()
+        )
+    )
+    if not ids_list:
         logger.error("Must input one or more Account IDs.")
-    elif not INPUT_FILE.get():
+        return
+    if not INPUT_FILE.get():
         logger.error(
             "Must select a JSON file containing the new configuration to apply."
         )
-    else:
-        endpoint = f"/web/api/{API_VERSION}/system/configuration"
-        url = HOSTNAME.get() + endpoint
-        ids_list = [x for x in site_acct_ids_list.get().split(",")]
-        logger.debug("ID List: %s", ids_list)
-        file_name = Path(INPUT_FILE.get())
-        valid_json = False
-
-        with open(file_name, "r", encoding="utf-8") as file:
-            logger.info("Reading %s", file_name)
-            try:
-                new_config = json.loads(file.read())
-                logger.debug("%s appears to contain valid JSON", file_name.name)
-                logger.debug("New config JSON contents: %s", new_config)
-                valid_json = True
-            except ValueError as exc:
+        return
+    logger.debug("ID List: %s", ids_list)
+    file_name = Path(INPUT_FILE.get())
+    with open(file_name, "r", encoding="utf-8") as file:
+        logger.info("Reading %s", file_name)
+        try:
+            new_config = json.loads(file.read())
+            logger.debug("%s appears to contain valid JSON", file_name.name)
+            logger.debug("New config JSON contents: %s", new_config)
+        except ValueError as exc:
+            logger.error(
+                "%s possibly contains invalid JSON, please validate it and try again. %s",
+                file_name.name,
+                exc,
+            )
+            return
+    if not isinstance(new_config, dict) or not isinstance(
+        new_config.get("filter"), dict
+    ):
+        logger.error(
+            "No 'filter' object found in JSON. Ensure your JSON is correctly defined."
+        )
+        return
+
+    id_type = update_sites_or_accts.get()
+    new_data = new_config.get("data", {})
+    current = {}
+    results = ResultsFile(
+        "Update_System_Config", ["ID", "HTTP Status", "Changed Keys", "Error"]
+    )
+    try:
+        logger.info("Getting the current configuration of %d ID(s)", len(ids_list))
+        run_async(run(fetch, ids_list))
+        run_at = datetime.datetime.utcnow().isoformat()
+        payloads = {}
+        snapshots = {}
+        for new_id in ids_list:
+            if new_id not in current:
+                continue
+            changes, previous = diff_sys_config(current[new_id], new_data)
+            if not changes:
+                logger.info("%s already has this configuration, skipping", new_id)
+                results.write({"ID": new_id, "Changed Keys": ""})
+                continue
+            # Each payload is built once from the parsed config, with only the keys that change
+            payloads[new_id] = {
+                **new_config,
+                "data": changes,
+                "filter": {**new_config["filter"], id_type: new_id},
+            }
+            snapshots[new_id] = (
+                run_at,
+                id_type,
+                new_id,
+                json.dumps(current[new_id]),
+                json.dumps(previous),
+                HOSTNAME.get(),
+            )
+        targets = list(payloads)
+        stages = [targets]
+        if sys_config_canary.get() and len(targets) > 1:
+            stages = [targets[:1], targets[1:]]
+            logger.info("Applying to canary %s first", targets[0])
+        updated = 0
+        for stage in stages:
+            if not stage:
+                continue
+            outcomes = run_async(run(apply, stage))
+            updated += sum(outcomes)
+            # Only IDs that were actually changed are saved, so a rollback never
+            # overwrites a configuration this run did not touch
+            save_snapshots(
+                [snapshots[new_id] for new_id, ok in zip(stage, outcomes) if ok]
+            )
+            if not all(outcomes) and stage is not stages[-1]:
                 logger.error(
-                    "%s possibly contains invalid JSON, please validate it and try again. %s",
-                    file_name.name,
-                    exc,
+                    "Canary update failed, the remaining %d ID(s) were not updated",
+                    len(targets) - len(stage),
                 )
-                valid_json = False
-
-        if valid_json:
-            for new_id in ids_list:
-                id_type = update_sites_or_accts.get()
-                logger.debug("Current ID: %s", new_id)
-                if isinstance(new_config, str):
-                    new_config = json.loads(new_config)
-                try:
-                    logger.info(
-                        "Updating JSON 'filter' with '%s':'%s'", id_type, new_id
-                    )
-                    if id_type == "siteIds":
-                        new_config["filter"]["siteIds"] = new_id
-                    elif id_type == "accountIds":
-                        new_config["filter"]["accountIds"] = new_id
-                except KeyError as err:
-                    logger.error(
-                        "Invalid key found in JSON. Ensure you selected the correct option between 'Sites' and 'Accounts', and that your JSON is correctly defined.\n%s",
-                        err,
-                    )
-                    break
+                break
+    finally:
+        results.close()
+    logger.info(
+        "Finished. Updated %d of %d ID(s), %d already up to date. Results written to %s",
+        updated,
+        len(ids_list),
+        len(current) - len(payloads),
+        results.csv_filename,
+    )
 
-                new_config = json.dumps(new_config)
-                logger.debug("Configuration: %s", new_config)
 
-                response = requests.put(
-                    url=url,
-                    headers=headers,
-                    data=new_config,
-                    proxies={"http": PROXY.get(), "https": PROXY.get()},
-                    verify=USE_SSL.get(),
-                )
-                logger.debug(
-                    "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                    url,
-                    headers,
-                    PROXY.get(),
-                    USE_SSL.get(),
-                )
-                if response.status_code != 200:
-                    logger.error(
-                        "Status: %s Problem with the request. Details - %s ",
-                        str(response.status_code),
-                        str(response.text),
-                    )
-                    break
-                response.raise_for_status()
-                logger.info("System configuration updated for %s", new_id)
+def rollback_sys_config():
+    """Function to re-apply the previous values saved in the most recent system
+    configuration snapshot taken on the logged in console"""
+    scroll_text = ScrolledText.ScrolledText(
+        master=UPDATE_SYSTEM_CONFIG_FRAME, state="disabled", height=10
+    )
+    scroll_text.configure(font=ST_FONT)
+    scroll_text.grid(row=13, column=0, columnspan=2, pady=10)
+    text_handler = TextHandler(scroll_text)
+    logging.basicConfig(
+        filename=LOG_NAME,
+        level=LOG_LEVEL,
+        format=LOG_FORMAT,
+    )
+    logger = logging.getLogger()
+    logger.addHandler(text_handler)
+
+    async def restore(session, snapshot):
+        scope_id, id_type, previous = snapshot
+        status, body = await api_request(
+            session,
+            "PUT",
+            "/system/configuration",
+            payload={"data": previous, "filter": {id_type: scope_id}},
+        )
+        result = {"ID": scope_id, "Changed Keys": ",".join(previous)}
+        if status != 200:
+            logger.error(
+                "Failed to roll back system configuration for %s Status: %s Details - %s",
+                scope_id,
+                status,
+                body,
+            )
+            results.write({**result, "HTTP Status": status, "Error": body})
+            return
+        logger.info("System configuration rolled back for %s", scope_id)
+        results.write({**result, "HTTP Status": status})
 
-            logger.info("Finished.")
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            await gather_bounded(lambda snapshot: restore(session, snapshot), snapshots)
+
+    connection = open_local_db()
+    try:
+        rows = connection.execute(
+            "SELECT run_at, scope_id, id_type, previous FROM sys_config_snapshots WHERE console = ? AND run_at = (SELECT MAX(run_at) FROM sys_config_snapshots WHERE console = ?)",
+            (HOSTNAME.get(), HOSTNAME.get()),
+        ).fetchall()
+    finally:
+        connection.close()
+    if not rows:
+        logger.error(
+            "No system configuration snapshot found in %s", get_local_db_name()
+        )
+        return
+    # Keys that did not exist before the update have no previous value to restore
+    snapshots = [
+        (scope_id, id_type, json.loads(previous))
+        for _, scope_id, id_type, previous in rows
+        if json.loads(previous)
+    ]
+    logger.info(
+        "Rolling back %d ID(s) to the snapshot taken %s", len(snapshots), rows[0][0]
+    )
+    results = ResultsFile(
+        "Rollback_System_Config", ["ID", "HTTP Status", "Changed Keys", "Error"]
+    )
+    try:
+        run_async(run())
+    finally:
+        results.close()
+    logger.info("Finished. Results written to %s", results.csv_filename)
 
 
 def bulk_enable_agents():
+    """Function to send the Enable Agent action (without reboot) to the disabled agents in
+    each of the specified groups, one group per request"""
     scroll_text = ScrolledText.ScrolledText(
         master=BULK_ENABLE_AGENTS_FRAME, state="disabled", height=10
     )
@@ -2903,52 +4991,100 @@ def bulk_enable_agents():
     logger = logging.getLogger()
     logger.addHandler(text_handler)
 
-    if not group_ids_list.get():
-        logger.error("Must input one or more Group IDs.")
-    else:
-        endpoint = f"/web/api/{API_VERSION}/agents/actions/enable-agent"
-        url = HOSTNAME.get() + endpoint
-        group_ids = [x for x in group_ids_list.get().split(",")]
-        logger.debug("ID List: %s", group_ids)
-
-        payload = json.dumps(
-            {
-                "data": {
-                    "shouldReboot": "false",
-                },
-                "filter": {"operationalStatesNin": "na", "groupIds": group_ids},
-            }
-        )
-
-        logger.info("Sending action to enable agents")
-        response = requests.post(
-            url=url,
-            headers=headers,
-            data=payload,
-            proxies={"http": PROXY.get(), "https": PROXY.get()},
-            verify=USE_SSL.get(),
-        )
-        logger.debug(
-            "Calling API with the following:\nURL: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-            url,
-            headers,
-            PROXY.get(),
-            USE_SSL.get(),
-        )
-        if response.status_code != 200:
+    async def enable(session, group_id):
+        payload = {
+            "data": {
+                "shouldReboot": "false",
+            },
+            "filter": {"operationalStatesNin": "na", "groupIds": [group_id]},
+        }
+        # api_request already retries rate limiting, this also retries server and connection errors
+        for attempt in range(API_RETRIES + 1):
+            try:
+                status, body = await api_request(
+                    session, "POST", "/agents/actions/enable-agent", payload=payload
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                status, body = None, str(error)
+            if status is not None and status < 500 or attempt == API_RETRIES:
+                break
+            logger.warning(
+                "Enable Agent action for group %s failed (%s), retrying",
+                group_id,
+                status,
+            )
+            await asyncio.sleep(2**attempt)
+        if status != 200:
             logger.error(
-                "Status: %s Problem with the request. Details - %s ",
-                str(response.status_code),
-                str(response.text),
+                "Failed to enable agents in group %s Error code: %s Description: %s",
+                group_id,
+                status,
+                body,
             )
-            response.raise_for_status()
+            result = {"Group ID": group_id, "HTTP Status": status, "Error": body}
         else:
-            data = response.json()
-            affected_agents = data.get("data").get("affected", "0")
-            logger.info("Enable Agent action sent to %s", group_ids)
-            logger.info("Total agents Enabled: %s", affected_agents)
+            affected = body["data"].get("affected", 0)
+            logger.info("Enabled %s agents in group %s", affected, group_id)
+            result = {"Group ID": group_id, "HTTP Status": status, "Affected": affected}
+        results.write(result)
+        return result
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            return await gather_bounded(
+                lambda group_id: enable(session, group_id), group_ids
+            )
+
+    group_ids = list(
+        dict.fromkeys(x.strip() for x in group_ids_list.get().split(",") if x.strip())
+    )
+    if not group_ids:
+        logger.error("Must input one or more Group IDs.")
+        return
+    logger.debug("ID List: %s", group_ids)
+    if PREFLIGHT.get():
+
+        async def preflight():
+            async with aiohttp.ClientSession() as session:
+                return await count_each(
+                    session,
+                    "/agents",
+                    [
+                        {"operationalStatesNin": "na", "groupIds": [group_id]}
+                        for group_id in group_ids
+                    ],
+                )
+
+        counts = run_async(preflight())
+        if not confirm_preflight("Bulk_Enable_Agents", group_ids, counts, "agents"):
+            return
+
+    logger.info("Sending action to enable agents in %d group(s)", len(group_ids))
+    results = ResultsFile(
+        "Bulk_Enable_Agents", ["Group ID", "HTTP Status", "Affected", "Error"]
+    )
+    try:
+        group_results = run_async(run())
+    finally:
+        results.close()
 
-        logger.info("Finished.")
+    logger.info("%-24s %10s %8s", "Group ID", "Affected", "Status")
+    for result in group_results:
+        logger.info(
+            "%-24s %10s %8s",
+            result["Group ID"],
+            result.get("Affected", "-"),
+            result["HTTP Status"],
+        )
+    failed = sum(result["HTTP Status"] != 200 for result in group_results)
+    logger.info(
+        "Total agents Enabled: %d across %d group(s), %d group(s) failed",
+        sum(result.get("Affected", 0) for result in group_results),
+        len(group_results) - failed,
+        failed,
+    )
+    logger.info("Results written to %s", results.csv_filename)
+    logger.info("Finished.")
 
 
 def export_blacklist():
@@ -3329,129 +5465,370 @@ def import_blacklist():
     logger = logging.getLogger()
     logger.addHandler(text_handler)
 
-    BL_ENDPOINT = "/restrictions"
-    PARTIAL_URL = f"{HOSTNAME.get()}/web/api/{API_VERSION}"
-    scope_ids = [x for x in bl_scope_ids_list.get().split(",")]
-    rsession = requests.Session()
-    url = PARTIAL_URL + BL_ENDPOINT
-    TYPE = "black_hash"
-    TENANT = False
+    with open(INPUT_FILE.get()) as csv_file:
+        logger.debug("Reading CSV: %s", INPUT_FILE.get())
+        csv_reader = csv.reader(csv_file, delimiter=",")
+        next(csv_reader)
+        rows = list(csv_reader)
+    line_count = len(rows)
+    if line_count < 1:
+        logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
+        return
+
+    entries, invalid, duplicate_count = preprocess_hash_rows(rows)
+    for line_number, row in invalid:
+        logger.error(
+            "Row %d: %s is not a valid entry. Please validate the value is a valid SHA1 (40 characters) or SHA256 (64 characters) and the OS Type is one of %s.",
+            line_number,
+            row,
+            ", ".join(AGENT_OS_TYPES),
+        )
+    logger.info(
+        "%d hashes to import: %d invalid and %d duplicates skipped",
+        len(entries),
+        len(invalid),
+        duplicate_count,
+    )
+    if not entries:
+        logger.info("Finished! Nothing to import.\n")
+        return
+
+    counts = import_scoped_entries(
+        "/restrictions",
+        {"type": "black_hash"},
+        bl_selected_scope.get(),
+        bl_scope_ids_list.get().split(","),
+        entries,
+        "Blacklist",
+        sync_mode=bl_sync_mode.get(),
+        sync_delete=bl_sync_delete.get(),
+    )
+    if counts is None:
+        return
+    logger.info(
+        "Finished! Processed %d lines. Created %d entries, deleted %d, %d failed.\n",
+        line_count,
+        counts["created"],
+        counts["deleted"],
+        counts["failed"],
+    )
+
+
+def import_exclusions():
+    """Function to import exclusions"""
+    scroll_text = ScrolledText.ScrolledText(
+        master=IMPORT_EXCLUSION_FRAME, state="disabled", height=10
+    )
+    scroll_text.configure(font=ST_FONT)
+    scroll_text.grid(row=13, column=0, pady=10)
+    text_handler = TextHandler(scroll_text)
+    logging.basicConfig(
+        filename=LOG_NAME,
+        level=LOG_LEVEL,
+        format=LOG_FORMAT,
+    )
+    logger = logging.getLogger()
+    logger.addHandler(text_handler)
 
     with open(INPUT_FILE.get()) as csv_file:
         logger.debug("Reading CSV: %s", INPUT_FILE.get())
         csv_reader = csv.reader(csv_file, delimiter=",")
         next(csv_reader)
-        line_count = 0
+        rows = list(csv_reader)
+    if not any(any(row) for row in rows):
+        logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
+        return
+
+    logger.info("Validating %d rows", len(rows))
+    entries, errors, duplicates = parse_exclusion_rows(rows)
+    for duplicate in duplicates:
+        logger.warning("Skipping %s", duplicate)
+    if errors:
+        for error in errors:
+            logger.error("%s", error)
+        logger.error(
+            "Found %d invalid rows. Nothing was imported, please fix the CSV and try again.\n",
+            len(errors),
+        )
+        return
+
+    counts = import_scoped_entries(
+        "/exclusions",
+        {},
+        excl_selected_scope.get(),
+        excl_scope_ids_list.get().split(","),
+        entries,
+        "Exclusion",
+        sync_mode=excl_sync_mode.get(),
+        sync_delete=excl_sync_delete.get(),
+    )
+    if counts is None:
+        return
+    logger.info(
+        "Finished! Processed %d lines. Created %d entries, deleted %d, %d failed, %d duplicates skipped.\n",
+        len(rows),
+        counts["created"],
+        counts["deleted"],
+        counts["failed"],
+        len(duplicates),
+    )
 
-        for row in csv_reader:
 
-            value = row[0].strip()
-            # Extremely basic check to ensure the sha1 is at least the correct char length
-            if len(value) != 40:
-                logger.error(
-                    "Hash value: %s on row : %s is not a valid SHA1. Please validate the value is a valid SHA1 (40 characters).",
-                    value,
-                    row,
-                )
-                continue
-            os_type = row[1]  # linux, macos, windows, windows_legacy
-            description = row[2] or ""
-            logger.info(
-                "Creating Blacklist entry: %s - %s - %s", value, os_type, description
-            )
-            # if row[2]:
-            #     description = row[2]
-            # else:
-            #     description = ""
-
-            logger.debug("Building payload based on selection and row")
-            if bl_selected_scope.get() == "group":
-                bl_payload = json.dumps(
-                    {
-                        "filter": {
-                            "tenant": TENANT,
-                            "groupIds": scope_ids,
-                        },
-                        "data": {
-                            "osType": os_type,
-                            "type": TYPE,
-                            "value": value,
-                            "description": description,
-                        },
-                    }
-                )
-            elif bl_selected_scope.get() == "site":
-                bl_payload = json.dumps(
-                    {
-                        "filter": {
-                            "tenant": TENANT,
-                            "siteIds": scope_ids,
-                        },
-                        "data": {
-                            "osType": os_type,
-                            "type": TYPE,
-                            "value": value,
-                            "description": description,
-                        },
-                    }
-                )
-            else:
-                bl_payload = json.dumps(
-                    {
-                        "filter": {
-                            "tenant": TENANT,
-                            "accountIds": scope_ids,
-                        },
-                        "data": {
-                            "osType": os_type,
-                            "type": TYPE,
-                            "value": value,
-                            "description": description,
-                        },
-                    }
-                )
+def migrate_entries(dry_run):
+    """Function to copy exclusions or blacklist entries from a source console or scope
+    straight into the logged in console, rewriting scope IDs on the way"""
+    scroll_text = ScrolledText.ScrolledText(
+        master=MIGRATE_ENTRIES_FRAME, state="disabled", height=10
+    )
+    scroll_text.configure(font=ST_FONT)
+    scroll_text.grid(row=13, column=0, columnspan=2, pady=10)
+    text_handler = TextHandler(scroll_text)
+    logging.basicConfig(
+        filename=LOG_NAME,
+        level=LOG_LEVEL,
+        format=LOG_FORMAT,
+    )
+    logger = logging.getLogger()
+    logger.addHandler(text_handler)
 
-            logger.debug("Payload for row %s", bl_payload)
-            logger.debug(
-                "Calling API with the following:\nURL: %s\tData: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                url,
-                bl_payload,
-                headers,
-                PROXY.get(),
-                USE_SSL.get(),
+    dataset = migrate_dataset.get()
+    if dataset == "exclusions":
+        endpoint, list_params = "/exclusions", {}
+    else:
+        endpoint, list_params = "/restrictions", {"type": "black_hash"}
+    scope = migrate_scope.get()
+    mappings = [
+        tuple(x.strip() for x in pair.split(":"))
+        for pair in migrate_scope_map.get().split(",")
+        if pair.strip()
+    ]
+    if not mappings or any(len(x) != 2 or not all(x) for x in mappings):
+        logger.error(
+            "Scope ID mappings must be source:target pairs, comma-separated with no spaces"
+        )
+        return
+
+    source = None
+    if migrate_source_url.get():
+        try:
+            source_headers, login_succ = test_login(
+                migrate_source_url.get(), migrate_source_token.get(), PROXY.get()
             )
-            response = rsession.post(
-                url,
-                data=bl_payload,
-                headers=headers,
-                proxies={"http": PROXY.get(), "https": PROXY.get()},
-                verify=USE_SSL.get(),
+        except requests.exceptions.RequestException as exc:
+            login_succ = False
+            logger.debug("Source console login failed: %s", exc)
+        if not login_succ:
+            logger.error(
+                "Authentication to the source console %s failed. Please check credentials and try again",
+                migrate_source_url.get(),
+            )
+            return
+        source = (migrate_source_url.get(), source_headers)
+
+    batch_size = get_batch_size()
+    concurrency = get_concurrency()
+    counts = {"create": 0, "present": 0, "only in target": 0, "failed": 0}
+    failed_mappings = []
+
+    def report(action, entry, mapping, status="", error=""):
+        if action == "create" and (error or status not in ("", 200)):
+            counts["failed"] += 1
+            logger.error(
+                "Failed to create %s entry for %s Error code: %s Description: %s",
+                dataset,
+                entry["value"],
+                status,
+                error,
             )
-            if response.status_code != 200:
-                logger.error(
-                    "Failed to create new Blacklist entry for hash %s Error code: %s Description: %s",
-                    row[0],
-                    str(response.status_code),
-                    str(response.text).strip(),
-                )
-            else:
-                logger.info(
-                    "Successfully created the Blacklist entry for hash %s", value
-                )
-            line_count += 1
-        if line_count < 1:
-            logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
         else:
-            logger.info("Finished! Processed %d lines.", line_count)
+            counts[action] += 1
+        results.write(
+            {
+                "Action": action,
+                "Value": entry["value"],
+                "Type": entry["type"],
+                "OS Type": entry["osType"],
+                "Source Scope ID": mapping[0],
+                "Target Scope ID": mapping[1],
+                "HTTP Status": status,
+                "Error": error,
+            }
+        )
+
+    async def sink(session, queue):
+        while True:
+            item = await queue.get()
+            if item is None:
+                queue.task_done()
+                return
+            mapping, batch = item
+            try:
+                created = await create_scoped_entries(
+                    session, endpoint, scope_filter(scope, [mapping[1]]), batch
+                )
+            except Exception as exc:
+                # Keep consuming whatever went wrong (connection errors, timeouts, an
+                # unexpected response body), a dead sink would stall the source reader
+                created = [(entry, "", repr(exc)) for entry in batch]
+            try:
+                for entry, status, error in created:
+                    report("create", entry, mapping, status, error)
+            finally:
+                queue.task_done()
+
+    async def migrate_scope(session, queue, mapping):
+        try:
+            await read_scope(session, queue, mapping)
+        except PaginationError as exc:
+            # Entries already queued are still created, but nothing is reported as only in
+            # the target, since the source was not read in full
+            status, error = exc.args
+            failed_mappings.append(mapping)
+            logger.error(
+                "Could not read every entry of %s %s to %s, the migration of this scope is incomplete",
+                scope,
+                *mapping,
+            )
+            results.write(
+                {
+                    "Action": "failed",
+                    "Source Scope ID": mapping[0],
+                    "Target Scope ID": mapping[1],
+                    "HTTP Status": status,
+                    "Error": error,
+                }
+            )
+
+    async def read_scope(session, queue, mapping):
+        source_id, target_id = mapping
+        existing = await fetch_scoped_entries(
+            session, endpoint, list_params, scope, [target_id]
+        )
+        target_keys = {entry_key(item): item for item in existing[target_id]}
+        seen = set()
+        params = {
+            "limit": 1000,
+            **list_params,
+            f"{scope}Ids": source_id,
+            "includeChildren": "false",
+            "includeParents": "false",
+        }
+        async for page in api_paginate(
+            session, endpoint, params, console=source, raise_on_error=True
+        ):
+            groups = {}
+            for item in page:
+                entry = {
+                    field: item[field]
+                    for field in MIGRATED_ENTRY_FIELDS
+                    if item.get(field) is not None
+                }
+                entry.setdefault("description", "")
+                key = entry_key(entry)
+                if key in seen:
+                    continue
+                seen.add(key)
+                if key in target_keys:
+                    report("present", entry, mapping)
+                elif dry_run:
+                    report("create", entry, mapping)
+                else:
+                    groups.setdefault((entry["osType"], entry["type"]), []).append(
+                        entry
+                    )
+            for group in groups.values():
+                for i in range(0, len(group), batch_size):
+                    await queue.put((mapping, group[i : i + batch_size]))
+            logger.info("Read %d entries from source scope %s", len(seen), source_id)
+        for key, item in target_keys.items():
+            if key not in seen:
+                report("only in target", item, mapping)
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            queue = asyncio.Queue(maxsize=concurrency * 2)
+            sinks = [
+                asyncio.ensure_future(sink(session, queue)) for _ in range(concurrency)
+            ]
 
+            async def produce():
+                for mapping in mappings:
+                    logger.info(
+                        "Migrating %s from %s %s to %s", dataset, scope, *mapping
+                    )
+                    await migrate_scope(session, queue, mapping)
+                for _ in sinks:
+                    await queue.put(None)
 
-def import_exclusions():
-    """Function to import exclusions"""
+            producer = asyncio.ensure_future(produce())
+            try:
+                while not producer.done():
+                    await asyncio.wait(
+                        [producer, *(task for task in sinks if not task.done())],
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    # With every sink dead the producer would wait on a full queue forever
+                    if not producer.done() and all(task.done() for task in sinks):
+                        producer.cancel()
+                        logger.error(
+                            "All create workers stopped, the migration was aborted"
+                        )
+                        return
+                producer.result()
+                await asyncio.gather(*sinks)
+            finally:
+                producer.cancel()
+                for task in sinks:
+                    task.cancel()
+
+    results = ResultsFile(
+        f"Migrate_{dataset}_DryRun" if dry_run else f"Migrate_{dataset}",
+        [
+            "Action",
+            "Value",
+            "Type",
+            "OS Type",
+            "Source Scope ID",
+            "Target Scope ID",
+            "HTTP Status",
+            "Error",
+        ],
+    )
+    try:
+        run_async(run())
+    finally:
+        results.close()
+    if failed_mappings:
+        logger.error(
+            "%d of %d scope mapping(s) could not be read in full: %s",
+            len(failed_mappings),
+            len(mappings),
+            ", ".join(":".join(mapping) for mapping in failed_mappings),
+        )
+    if dry_run:
+        logger.info(
+            "Dry run finished! %d entries would be created, %d already present, %d only in the target. Nothing was changed.",
+            counts["create"],
+            counts["present"],
+            counts["only in target"],
+        )
+    else:
+        logger.info(
+            "Finished! Created %d entries, %d failed, %d already present.",
+            counts["create"],
+            counts["failed"],
+            counts["present"],
+        )
+    logger.info("Report written to %s\n", results.csv_filename)
+
+
+def sync_local_data():
+    """Function to sync the selected dataset into the local SQLite database"""
     scroll_text = ScrolledText.ScrolledText(
-        master=IMPORT_EXCLUSION_FRAME, state="disabled", height=10
+        master=LOCAL_QUERY_FRAME, state="disabled", height=10
     )
     scroll_text.configure(font=ST_FONT)
-    scroll_text.grid(row=13, column=0, pady=10)
+    scroll_text.grid(row=13, column=0, columnspan=2, pady=10)
     text_handler = TextHandler(scroll_text)
     logging.basicConfig(
         filename=LOG_NAME,
@@ -3461,109 +5838,78 @@ def import_exclusions():
     logger = logging.getLogger()
     logger.addHandler(text_handler)
 
-    EXCL_ENDPOINT = "/exclusions"
-    PARTIAL_URL = f"{HOSTNAME.get()}/web/api/{API_VERSION}"
-    scope_ids = [x for x in excl_scope_ids_list.get().split(",")]
-    rsession = requests.Session()
-    url = PARTIAL_URL + EXCL_ENDPOINT
-    TENANT = False
+    dataset = local_query_dataset.get()
 
-    with open(INPUT_FILE.get()) as csv_file:
-        logger.debug("Reading CSV: %s", INPUT_FILE.get())
-        csv_reader = csv.reader(csv_file, delimiter=",")
-        next(csv_reader)
-        line_count = 0
+    async def sync(connection):
+        async with aiohttp.ClientSession() as session:
+            return await sync_local_dataset(session, connection, dataset)
 
-        for row in csv_reader:
-            logger.info("Creating Exclusion entry: %s", row)
-
-            value = row[0]
-            type = row[1]  # browser, certificate, file_type, path, white_hash
-            os_type = row[2]  # linux, macos, windows, windows_legacy
-            mode = (
-                row[3] or None
-            )  # disable_all_monitors, disable_all_monitors_deep, disable_in_process_monitor, disable_in_process_monitor_deep, suppress, suppress_app_control, suppress_dfi_only, suppress_dynamic_only
-            path_excl_type = row[4] or None  # file, subfolders
-            description = row[5] or ""
-
-            logger.debug("Building payload filter based on selection")
-            if excl_selected_scope.get() == "group":
-                excl_payload_filter = {
-                    "filter": {
-                        "tenant": TENANT,
-                        "groupIds": scope_ids,
-                    }
-                }
-            elif excl_selected_scope.get() == "site":
-                excl_payload_filter = {
-                    "filter": {
-                        "tenant": TENANT,
-                        "siteIds": scope_ids,
-                    }
-                }
-            else:
-                excl_payload_filter = {
-                    "filter": {
-                        "tenant": TENANT,
-                        "accountIds": scope_ids,
-                    }
-                }
+    logger.info("Syncing %s into %s", dataset, get_local_db_name())
+    connection = open_local_db()
+    try:
+        total = run_async(sync(connection))
+    finally:
+        connection.close()
+    if total is None:
+        return
+    logger.info("Done! Fetched %d %s.\n", total, dataset)
 
-            logger.debug("Building payload data based on row")
-            if row[1] in ("browser", "certificate", "file_type", "white_hash"):
-                excl_payload_data = {
-                    "data": {
-                        "osType": os_type,
-                        "type": type,
-                        "value": value,
-                        "description": description,
-                    }
-                }
-            else:
-                excl_payload_data = {
-                    "data": {
-                        "osType": os_type,
-                        "type": type,
-                        "value": value,
-                        "description": description,
-                        "mode": mode,
-                        "pathExclusionType": path_excl_type,
-                    }
-                }
 
-            logger.debug("Building payload")
-            excl_payload = json.dumps({**excl_payload_filter, **excl_payload_data})
-            logger.debug("Payload for row %s", excl_payload)
+def query_local_data():
+    """Function to filter and aggregate locally synced console data without calling the API"""
+    scroll_text = ScrolledText.ScrolledText(
+        master=LOCAL_QUERY_FRAME, state="disabled", height=10
+    )
+    scroll_text.configure(font=ST_FONT)
+    scroll_text.grid(row=13, column=0, columnspan=2, pady=10)
+    text_handler = TextHandler(scroll_text)
+    logging.basicConfig(
+        filename=LOG_NAME,
+        level=LOG_LEVEL,
+        format=LOG_FORMAT,
+    )
+    logger = logging.getLogger()
+    logger.addHandler(text_handler)
 
-            logger.debug(
-                "Calling API with the following:\nURL: %s\tData: %s\tHeaders: %s\tProxy: %s\tUse SSL: %s",
-                url,
-                excl_payload,
-                headers,
-                PROXY.get(),
-                USE_SSL.get(),
-            )
-            response = rsession.post(
-                url,
-                data=excl_payload,
-                headers=headers,
-                proxies={"http": PROXY.get(), "https": PROXY.get()},
-                verify=USE_SSL.get(),
-            )
-            if response.status_code != 200:
-                logger.error(
-                    "Failed to create new Exclusion entry for %s Error code: %s Description: %s",
-                    row[0],
-                    str(response.status_code),
-                    str(response.text).strip(),
-                )
-            else:
-                logger.info("Successfully created the Exclusion entry for %s", row[0])
-            line_count += 1
-        if line_count < 1:
-            logger.info("Finished! Input file %s was empty.", INPUT_FILE.get())
-        else:
-            logger.info("Finished! Processed %d lines.", line_count)
+    dataset = local_query_dataset.get()
+    if not os.path.isfile(get_local_db_name()):
+        logger.error(
+            "%s not found. Sync one or more datasets first.", get_local_db_name()
+        )
+        return
+    try:
+        sql, params, columns = build_local_query(
+            dataset, local_query_filters.get(), local_query_group_by.get()
+        )
+    except ValueError as exc:
+        logger.error("%s", exc)
+        return
+    logger.debug("Running local query: %s Params: %s", sql, params)
+
+    connection = open_local_db()
+    try:
+        started = time.perf_counter()
+        results = connection.execute(sql, params).fetchall()
+        elapsed = (time.perf_counter() - started) * 1000
+    except sqlite3.Error as exc:
+        logger.error("Local query failed: %s", exc)
+        return
+    finally:
+        connection.close()
+
+    logger.info("%d result(s) from %s in %.1f ms", len(results), dataset, elapsed)
+    logger.info(" | ".join(columns))
+    for row in results[:25]:
+        logger.info(" | ".join(str(value) for value in row))
+    if len(results) > 25:
+        logger.info("... %d more", len(results) - 25)
+
+    if EXPORT_QUERY_RESULTS.get():
+        datestamp = datetime.datetime.now().strftime("%Y-%m-%d_%f")
+        output_file = write_rows(
+            [columns, *results], "csv", f"Local_Query_{dataset}_{datestamp}", dataset
+        )
+        logger.info("Done! Output file is - %s\n", output_file)
 
 
 # Login Menu Frame #############################
@@ -3697,8 +6043,8 @@ ttk.Button(
 ).grid(row=5, column=1, sticky="ew", ipady=5, pady=5, padx=5)
 ttk.Button(
     master=MAIN_MENU_FRAME,
-    text=" ",
-    command="",
+    text="Query Local Data",
+    command=partial(switch_frames, LOCAL_QUERY_FRAME),
     width=32,
 ).grid(row=6, column=1, sticky="ew", ipady=5, pady=5, padx=5)
 
@@ -3769,6 +6115,12 @@ ttk.Button(
     command=partial(switch_frames, IMPORT_EXCLUSION_FRAME),
     width=32,
 ).grid(row=6, column=3, sticky="ew", ipady=5, pady=5, padx=5)
+ttk.Button(
+    master=MAIN_MENU_FRAME,
+    text="Migrate Exclusions/Blacklist",
+    command=partial(switch_frames, MIGRATE_ENTRIES_FRAME),
+    width=32,
+).grid(row=7, column=2, sticky="ew", ipady=5, pady=5, padx=5)
 
 
 if LOG_LEVEL == logging.DEBUG:
@@ -3865,7 +6217,7 @@ tk.Label(
 ).grid(row=0, column=0, padx=20, pady=20)
 tk.Label(
     master=UPGRADE_FROM_CSV_FRAME,
-    text="Upgrade Agents to a specific package version by ID.",
+    text="Upgrade Agents to a specific package by ID, or to the right package for each agent.",
     font=FRAME_SUBTITLE_FONT,
 ).grid(row=1, column=0, padx=20, pady=2)
 tk.Label(
@@ -3876,11 +6228,18 @@ ttk.Button(
     text="Export Packages List",
     command=partial(upgrade_from_csv, True),
 ).grid(row=3, column=0, pady=10)
-tk.Label(master=UPGRADE_FROM_CSV_FRAME, text="2. Insert the Package ID").grid(
-    row=4, column=0, pady=2
-)
-package_id_entry = ttk.Entry(master=UPGRADE_FROM_CSV_FRAME, width=80)
-package_id_entry.grid(row=5, column=0, pady=2)
+tk.Label(
+    master=UPGRADE_FROM_CSV_FRAME,
+    text="2. Insert the Package ID, or leave it empty to pick a package per OS and architecture\n(the newest GA package, or the package at the version below)",
+).grid(row=4, column=0, pady=2)
+package_frame = ttk.Frame(master=UPGRADE_FROM_CSV_FRAME)
+package_frame.grid(row=5, column=0, pady=2)
+tk.Label(master=package_frame, text="Package ID:").grid(row=0, column=0, padx=5)
+package_id_entry = ttk.Entry(master=package_frame, width=30)
+package_id_entry.grid(row=0, column=1, padx=5)
+tk.Label(master=package_frame, text="Version:").grid(row=0, column=2, padx=5)
+package_version_entry = ttk.Entry(master=package_frame, width=20)
+package_version_entry.grid(row=0, column=3, padx=5)
 tk.Label(
     master=UPGRADE_FROM_CSV_FRAME,
     text="3. Select a CSV file containing a single column of endpoint names to upgrade",
@@ -3893,25 +6252,68 @@ ttk.Button(
 tk.Label(master=UPGRADE_FROM_CSV_FRAME, textvariable=INPUT_FILE).grid(
     row=8, column=0, pady=2
 )
+upgrade_options_frame = ttk.Frame(master=UPGRADE_FROM_CSV_FRAME)
+upgrade_options_frame.grid(row=9, column=0, pady=10)
 use_schedule_switch = ttk.Checkbutton(
-    master=UPGRADE_FROM_CSV_FRAME,
+    master=upgrade_options_frame,
     text="Use Schedule",
     style="Switch",
     variable=USE_SCHEDULE,
     onvalue=True,
     offvalue=False,
 )
-use_schedule_switch.grid(row=9, column=0, pady=10)
+use_schedule_switch.grid(row=0, column=0, padx=10)
+add_concurrency_control(upgrade_options_frame).grid(row=0, column=1, padx=10)
+upgrade_waves_frame = ttk.Frame(master=upgrade_options_frame)
+upgrade_waves_frame.grid(row=1, column=0, columnspan=2, pady=(10, 0))
+tk.Label(master=upgrade_waves_frame, text="Agents per wave (0 = all):").grid(
+    row=0, column=0, padx=5
+)
+ttk.Spinbox(
+    master=upgrade_waves_frame,
+    from_=0,
+    to=100000,
+    increment=100,
+    textvariable=WAVE_SIZE,
+    width=7,
+).grid(row=0, column=1, padx=5)
+tk.Label(master=upgrade_waves_frame, text="Min. success %:").grid(
+    row=0, column=2, padx=5
+)
+ttk.Spinbox(
+    master=upgrade_waves_frame,
+    from_=0,
+    to=100,
+    textvariable=WAVE_SUCCESS_PERCENT,
+    width=5,
+).grid(row=0, column=3, padx=5)
+tk.Label(master=upgrade_waves_frame, text="Wave timeout (min):").grid(
+    row=0, column=4, padx=5
+)
+ttk.Spinbox(
+    master=upgrade_waves_frame,
+    from_=1,
+    to=1440,
+    textvariable=WAVE_TIMEOUT,
+    width=5,
+).grid(row=0, column=5, padx=5)
 tk.Label(
     master=UPGRADE_FROM_CSV_FRAME,
     text="Note: Will request upgrade immediately, unless 'Use Schedule' is toggled on.",
     font=FRAME_SUBNOTE_FONT,
 ).grid(row=10, column=0, pady=2)
+upgrade_buttons_frame = ttk.Frame(master=UPGRADE_FROM_CSV_FRAME)
+upgrade_buttons_frame.grid(row=11, column=0, pady=10)
 ttk.Button(
-    master=UPGRADE_FROM_CSV_FRAME,
+    master=upgrade_buttons_frame,
     text="Submit",
     command=partial(upgrade_from_csv, False),
-).grid(row=11, column=0, pady=10)
+).grid(row=0, column=0, padx=10)
+ttk.Button(
+    master=upgrade_buttons_frame,
+    text="Stop",
+    command=stop_upgrade,
+).grid(row=0, column=1, padx=10)
 ttk.Button(
     master=UPGRADE_FROM_CSV_FRAME,
     text="Back to Main Menu",
@@ -3952,16 +6354,32 @@ ttk.Button(master=MOVE_AGENTS_FRAME, text="Browse", command=select_csv_file).gri
 tk.Label(master=MOVE_AGENTS_FRAME, textvariable=INPUT_FILE).grid(
     row=7, column=0, pady=10
 )
+move_agents_options_frame = ttk.Frame(master=MOVE_AGENTS_FRAME)
+move_agents_options_frame.grid(row=8, column=0, pady=10)
+move_use_local_index = tk.BooleanVar()
+move_use_local_index.set(False)
+ttk.Checkbutton(
+    master=move_agents_options_frame,
+    text="Resolve names from local agent index",
+    style="Switch",
+    variable=move_use_local_index,
+    onvalue=True,
+    offvalue=False,
+).grid(row=0, column=0, padx=10)
+add_concurrency_control(move_agents_options_frame).grid(row=0, column=1, padx=10)
+add_preflight_control(move_agents_options_frame).grid(
+    row=1, column=0, columnspan=2, pady=(10, 0)
+)
 ttk.Button(
     master=MOVE_AGENTS_FRAME,
     text="Submit",
     command=partial(move_agents, False),
-).grid(row=8, column=0, pady=10)
+).grid(row=9, column=0, pady=10)
 ttk.Button(
     master=MOVE_AGENTS_FRAME,
     text="Back to Main Menu",
     command=go_back_to_mainpage,
-).grid(row=9, column=0, ipadx=10, pady=10)
+).grid(row=10, column=0, ipadx=10, pady=10)
 
 
 # Assign Customer Identifier Frame #############################
@@ -4023,16 +6441,28 @@ ttk.Button(
 tk.Label(master=DECOMMISSION_AGENTS_FRAME, textvariable=INPUT_FILE).grid(
     row=3, column=0, pady=10
 )
+decommission_use_local_index = tk.BooleanVar()
+decommission_use_local_index.set(False)
+ttk.Checkbutton(
+    master=DECOMMISSION_AGENTS_FRAME,
+    text="Resolve names from local agent index",
+    style="Switch",
+    variable=decommission_use_local_index,
+    onvalue=True,
+    offvalue=False,
+).grid(row=4, column=0, pady=10)
+add_concurrency_control(DECOMMISSION_AGENTS_FRAME).grid(row=5, column=0, pady=2)
+add_preflight_control(DECOMMISSION_AGENTS_FRAME).grid(row=6, column=0, pady=10)
 ttk.Button(
     master=DECOMMISSION_AGENTS_FRAME,
     text="Submit",
     command=decommission_agents,
-).grid(row=4, column=0, pady=10)
+).grid(row=7, column=0, pady=10)
 ttk.Button(
     master=DECOMMISSION_AGENTS_FRAME,
     text="Back to Main Menu",
     command=go_back_to_mainpage,
-).grid(row=5, column=0, ipadx=10, pady=10)
+).grid(row=8, column=0, ipadx=10, pady=10)
 
 
 # Export all agents Frame #############################
@@ -4043,19 +6473,70 @@ tk.Label(
 ).grid(row=0, column=0, columnspan=2, padx=20, pady=20)
 tk.Label(
     master=EXPORT_ENDPOINTS_FRAME,
-    text="Exports up to 300,000 Agent details to a CSV, and converts it to XLSX",
+    text="Exports up to 300,000 Agent details, streamed straight into the selected output type",
     font=FRAME_SUBTITLE_FONT,
 ).grid(row=1, column=0, columnspan=2, padx=20, pady=2)
+tk.Label(
+    master=EXPORT_ENDPOINTS_FRAME,
+    text="1. Select output type",
+).grid(row=2, column=0, columnspan=2, padx=20, pady=2)
+available_endpoint_output_types = ("", "xlsx", "raw", "jsonl", "sqlite")
+endpoints_output_type = tk.StringVar()
+endpoints_output_type.set(available_endpoint_output_types[1])
+ttk.OptionMenu(
+    EXPORT_ENDPOINTS_FRAME, endpoints_output_type, *available_endpoint_output_types
+).grid(row=3, column=0, columnspan=2, pady=10)
+tk.Label(
+    master=EXPORT_ENDPOINTS_FRAME,
+    text="Note: 'raw' writes the console CSV as-is without parsing it.",
+    font=FRAME_SUBNOTE_FONT,
+).grid(row=4, column=0, columnspan=2, pady=2)
 ttk.Button(
     master=EXPORT_ENDPOINTS_FRAME,
-    text="Export",
-    command=export_all_agents,
-).grid(row=2, column=0, columnspan=2, pady=10)
+    text="Export Light-Report",
+    command=partial(export_all_agents, False),
+).grid(row=5, column=0, columnspan=2, pady=10)
+tk.Label(
+    master=EXPORT_ENDPOINTS_FRAME,
+    text="2. Or export the full inventory: input agent fields to include, comma-separated",
+).grid(row=6, column=0, columnspan=2, padx=20, pady=2)
+agent_fields_entry = ttk.Entry(master=EXPORT_ENDPOINTS_FRAME, width=80)
+agent_fields_entry.insert(0, AGENT_INVENTORY_FIELDS)
+agent_fields_entry.grid(row=7, column=0, columnspan=2, pady=2)
+tk.Label(master=EXPORT_ENDPOINTS_FRAME, text="Split requests by:").grid(
+    row=8, column=0, padx=10, pady=2, sticky="e"
+)
+available_agent_shard_types = ("", "none", "siteIds", "osTypes")
+agent_shard_type = tk.StringVar()
+agent_shard_type.set(available_agent_shard_types[2])
+ttk.OptionMenu(
+    EXPORT_ENDPOINTS_FRAME, agent_shard_type, *available_agent_shard_types
+).grid(row=8, column=1, padx=10, pady=2, sticky="w")
+tk.Label(master=EXPORT_ENDPOINTS_FRAME, text="Max concurrent requests:").grid(
+    row=9, column=0, padx=10, pady=2, sticky="e"
+)
+ttk.Spinbox(
+    master=EXPORT_ENDPOINTS_FRAME,
+    from_=1,
+    to=32,
+    textvariable=MAX_CONCURRENCY,
+    width=5,
+).grid(row=9, column=1, padx=10, pady=2, sticky="w")
+ttk.Button(
+    master=EXPORT_ENDPOINTS_FRAME,
+    text="Export Full Inventory",
+    command=partial(export_all_agents, True),
+).grid(row=10, column=0, columnspan=2, pady=10)
+ttk.Button(
+    master=EXPORT_ENDPOINTS_FRAME,
+    text="Sync Local Agent Index",
+    command=sync_agent_inventory,
+).grid(row=11, column=0, columnspan=2, pady=10)
 ttk.Button(
     master=EXPORT_ENDPOINTS_FRAME,
     text="Back to Main Menu",
     command=go_back_to_mainpage,
-).grid(row=3, column=0, columnspan=2, ipadx=10, pady=10)
+).grid(row=12, column=0, columnspan=2, ipadx=10, pady=10)
 
 
 # Export Exclusions #############################
@@ -4162,9 +6643,14 @@ ttk.Button(
 tk.Label(master=MANAGE_ENDPOINT_TAGS_FRAME, textvariable=INPUT_FILE).grid(
     row=10, column=0, columnspan=2, pady=10
 )
+manage_endpoint_tags_actions_frame = ttk.Frame(master=MANAGE_ENDPOINT_TAGS_FRAME)
+manage_endpoint_tags_actions_frame.grid(row=11, column=0, columnspan=2, pady=10)
+add_preflight_control(manage_endpoint_tags_actions_frame).grid(row=0, column=0, padx=10)
 ttk.Button(
-    master=MANAGE_ENDPOINT_TAGS_FRAME, text="Submit", command=manage_endpoint_tags
-).grid(row=11, column=0, columnspan=2, pady=10)
+    master=manage_endpoint_tags_actions_frame,
+    text="Submit",
+    command=manage_endpoint_tags,
+).grid(row=0, column=1, padx=10)
 ttk.Button(
     master=MANAGE_ENDPOINT_TAGS_FRAME,
     text="Back to Main Menu",
@@ -4178,7 +6664,7 @@ tk.Label(
 ).grid(row=0, column=0, padx=20, pady=20)
 tk.Label(
     master=EXPORT_LOCAL_CONFIG_FRAME,
-    text="Exports the local agent configuration to a single JSON file.",
+    text="Exports the local agent configuration to a compressed NDJSON file or an archive of JSON files.",
     font=FRAME_SUBTITLE_FONT,
 ).grid(row=1, column=0, padx=20, pady=2)
 tk.Label(
@@ -4193,16 +6679,41 @@ ttk.Button(
 tk.Label(master=EXPORT_LOCAL_CONFIG_FRAME, textvariable=INPUT_FILE).grid(
     row=4, column=0, pady=10
 )
+local_config_options_frame = ttk.Frame(master=EXPORT_LOCAL_CONFIG_FRAME)
+local_config_options_frame.grid(row=5, column=0, pady=2)
+tk.Label(master=local_config_options_frame, text="Output:").grid(
+    row=0, column=0, padx=5
+)
+available_local_config_output_types = ("", "ndjson.gz", "zip", "tar.gz")
+local_config_output_type = tk.StringVar()
+local_config_output_type.set(available_local_config_output_types[1])
+ttk.OptionMenu(
+    local_config_options_frame,
+    local_config_output_type,
+    *available_local_config_output_types,
+).grid(row=0, column=1, padx=5)
+add_concurrency_control(local_config_options_frame).grid(row=0, column=2, padx=5)
 ttk.Button(
     master=EXPORT_LOCAL_CONFIG_FRAME,
     text="Export",
     command=export_local_config,
-).grid(row=5, column=0, pady=10)
+).grid(row=6, column=0, pady=10)
+tk.Label(
+    master=EXPORT_LOCAL_CONFIG_FRAME,
+    text="2. To analyze drift, browse to an exported file and optionally input keys to ignore, comma-separated",
+).grid(row=7, column=0, padx=20, pady=2)
+drift_ignored_keys = ttk.Entry(master=EXPORT_LOCAL_CONFIG_FRAME, width=80)
+drift_ignored_keys.grid(row=8, column=0, pady=2)
+ttk.Button(
+    master=EXPORT_LOCAL_CONFIG_FRAME,
+    text="Analyze Config Drift",
+    command=analyze_config_drift,
+).grid(row=9, column=0, pady=10)
 ttk.Button(
     master=EXPORT_LOCAL_CONFIG_FRAME,
     text="Back to Main Menu",
     command=go_back_to_mainpage,
-).grid(row=6, column=0, ipadx=10, pady=10)
+).grid(row=10, column=0, ipadx=10, pady=10)
 
 
 # Export Users and Roles Frame #############################
@@ -4232,11 +6743,12 @@ ttk.Button(
     text="Export Roles",
     command=export_roles,
 ).grid(row=3, column=1, pady=10)
+add_concurrency_control(EXPORT_USERS_FRAME).grid(row=4, column=0, columnspan=2, pady=2)
 ttk.Button(
     master=EXPORT_USERS_FRAME,
     text="Back to Main Menu",
     command=go_back_to_mainpage,
-).grid(row=4, column=0, columnspan=2, ipadx=10, pady=10)
+).grid(row=5, column=0, columnspan=2, ipadx=10, pady=10)
 
 
 # Export Ranger Inventory Frame #############################
@@ -4287,16 +6799,34 @@ export_ranger_timeperiod.set(available_timeperiods[1])
 ttk.OptionMenu(
     EXPORT_RANGER_INV_FRAME, export_ranger_timeperiod, *available_timeperiods
 ).grid(row=8, column=0, columnspan=2, pady=10)
+ranger_merge_output = tk.BooleanVar()
+ranger_merge_output.set(False)
+ttk.Checkbutton(
+    master=EXPORT_RANGER_INV_FRAME,
+    text="Merge into a single CSV with a Scope ID column",
+    style="Switch",
+    variable=ranger_merge_output,
+    onvalue=True,
+    offvalue=False,
+).grid(row=9, column=0, padx=10, pady=10, sticky="e")
+add_concurrency_control(EXPORT_RANGER_INV_FRAME).grid(
+    row=9, column=1, padx=10, pady=10, sticky="w"
+)
 ttk.Button(
     master=EXPORT_RANGER_INV_FRAME,
     text="Export",
     command=export_ranger,
-).grid(row=9, column=0, columnspan=2, pady=10)
+).grid(row=10, column=0, padx=10, pady=10, sticky="e")
+ttk.Button(
+    master=EXPORT_RANGER_INV_FRAME,
+    text="Snapshot and Report Changes",
+    command=snapshot_ranger,
+).grid(row=10, column=1, padx=10, pady=10, sticky="w")
 ttk.Button(
     master=EXPORT_RANGER_INV_FRAME,
     text="Back to Main Menu",
     command=go_back_to_mainpage,
-).grid(row=10, column=0, columnspan=2, ipadx=10, pady=10)
+).grid(row=11, column=0, columnspan=2, ipadx=10, pady=10)
 
 
 # Bulk Resolve Threats Frame #############################
@@ -4316,24 +6846,42 @@ tk.Label(
 ).grid(row=2, column=0, columnspan=2, padx=20, pady=2)
 incident_search_type = tk.StringVar()
 incident_search_type.set("threat_name")
+incident_search_type_frame = ttk.Frame(master=BULK_RESOLVE_THREATS_FRAME)
+incident_search_type_frame.grid(row=3, column=0, columnspan=2, pady=2)
 ttk.Radiobutton(
-    BULK_RESOLVE_THREATS_FRAME,
+    incident_search_type_frame,
     text="Threat Name",
     variable=incident_search_type,
     value="threat_name",
-).grid(row=3, column=0, padx=10, pady=2, sticky="e")
+).grid(row=0, column=0, padx=10)
 ttk.Radiobutton(
-    BULK_RESOLVE_THREATS_FRAME,
+    incident_search_type_frame,
     text="SHA1",
     variable=incident_search_type,
     value="content_hash",
-).grid(row=3, column=1, padx=10, pady=2, sticky="w")
+).grid(row=0, column=1, padx=10)
+ttk.Radiobutton(
+    incident_search_type_frame,
+    text="CSV of SHA1s and Threat Names",
+    variable=incident_search_type,
+    value="csv",
+).grid(row=0, column=2, padx=10)
 tk.Label(
     master=BULK_RESOLVE_THREATS_FRAME,
-    text="2. Input partial or complete threat name, or SHA1 based on above choice",
+    text="2. Input partial or complete threat name, or SHA1s, or browse to a CSV based on above choice",
 ).grid(row=4, column=0, columnspan=2, padx=20, pady=2)
-incident_search_value = ttk.Entry(master=BULK_RESOLVE_THREATS_FRAME, width=80)
-incident_search_value.grid(row=5, column=0, columnspan=2, pady=10)
+incident_search_value_frame = ttk.Frame(master=BULK_RESOLVE_THREATS_FRAME)
+incident_search_value_frame.grid(row=5, column=0, columnspan=2, pady=10)
+incident_search_value = ttk.Entry(master=incident_search_value_frame, width=60)
+incident_search_value.grid(row=0, column=0, padx=5)
+ttk.Button(
+    master=incident_search_value_frame,
+    text="Browse",
+    command=select_csv_file,
+).grid(row=0, column=1, padx=5)
+tk.Label(master=incident_search_value_frame, textvariable=INPUT_FILE).grid(
+    row=1, column=0, columnspan=2, pady=2
+)
 tk.Label(
     master=BULK_RESOLVE_THREATS_FRAME,
     text="3. Select Analyst Verdict",
@@ -4350,11 +6898,22 @@ tk.Label(
 ).grid(row=8, column=0, columnspan=2, padx=20, pady=2)
 site_ids_list = ttk.Entry(master=BULK_RESOLVE_THREATS_FRAME, width=80)
 site_ids_list.grid(row=9, column=0, columnspan=2, pady=10)
+bulk_resolve_actions_frame = ttk.Frame(master=BULK_RESOLVE_THREATS_FRAME)
+bulk_resolve_actions_frame.grid(row=10, column=0, columnspan=2, pady=10)
 ttk.Button(
-    master=BULK_RESOLVE_THREATS_FRAME,
+    master=bulk_resolve_actions_frame,
+    text="Export Matching Threats",
+    command=export_matching_threats,
+).grid(row=0, column=0, padx=10)
+ttk.Button(
+    master=bulk_resolve_actions_frame,
     text="Resolve Incidents",
     command=bulk_resolve_threats,
-).grid(row=10, column=0, columnspan=2, pady=10)
+).grid(row=0, column=1, padx=10)
+add_concurrency_control(bulk_resolve_actions_frame).grid(row=0, column=2, padx=10)
+add_preflight_control(bulk_resolve_actions_frame).grid(
+    row=1, column=0, columnspan=3, pady=(10, 0)
+)
 ttk.Button(
     master=BULK_RESOLVE_THREATS_FRAME,
     text="Back to Main Menu",
@@ -4409,16 +6968,34 @@ ttk.Button(
 tk.Label(master=UPDATE_SYSTEM_CONFIG_FRAME, textvariable=INPUT_FILE).grid(
     row=8, column=0, columnspan=2, pady=2
 )
+update_sys_config_options_frame = ttk.Frame(master=UPDATE_SYSTEM_CONFIG_FRAME)
+update_sys_config_options_frame.grid(row=9, column=0, columnspan=2, pady=10)
+sys_config_canary = tk.BooleanVar()
+sys_config_canary.set(True)
+ttk.Checkbutton(
+    master=update_sys_config_options_frame,
+    text="Update the first ID as a canary before the rest",
+    style="Switch",
+    variable=sys_config_canary,
+    onvalue=True,
+    offvalue=False,
+).grid(row=0, column=0, padx=10)
+add_concurrency_control(update_sys_config_options_frame).grid(row=0, column=1, padx=10)
 ttk.Button(
     master=UPDATE_SYSTEM_CONFIG_FRAME,
     text="Update",
     command=update_sys_config,
-).grid(row=9, column=0, columnspan=2, pady=10)
+).grid(row=10, column=0, padx=10, pady=10, sticky="e")
+ttk.Button(
+    master=UPDATE_SYSTEM_CONFIG_FRAME,
+    text="Rollback Last Update",
+    command=rollback_sys_config,
+).grid(row=10, column=1, padx=10, pady=10, sticky="w")
 ttk.Button(
     master=UPDATE_SYSTEM_CONFIG_FRAME,
     text="Back to Main Menu",
     command=go_back_to_mainpage,
-).grid(row=10, column=0, columnspan=2, ipadx=10, pady=10)
+).grid(row=11, column=0, columnspan=2, ipadx=10, pady=10)
 
 
 # Bulk Enable Agents Frame #############################
@@ -4434,16 +7011,22 @@ tk.Label(
 ).grid(row=1, column=0, columnspan=2, padx=20, pady=2)
 group_ids_list = ttk.Entry(master=BULK_ENABLE_AGENTS_FRAME, width=80)
 group_ids_list.grid(row=2, column=0, columnspan=2, pady=10)
+add_concurrency_control(BULK_ENABLE_AGENTS_FRAME).grid(
+    row=3, column=0, columnspan=2, pady=2
+)
+add_preflight_control(BULK_ENABLE_AGENTS_FRAME).grid(
+    row=4, column=0, columnspan=2, pady=10
+)
 ttk.Button(
     master=BULK_ENABLE_AGENTS_FRAME,
     text="Enable",
     command=bulk_enable_agents,
-).grid(row=3, column=0, columnspan=2, pady=10)
+).grid(row=5, column=0, columnspan=2, pady=10)
 ttk.Button(
     master=BULK_ENABLE_AGENTS_FRAME,
     text="Back to Main Menu",
     command=go_back_to_mainpage,
-).grid(row=4, column=0, columnspan=2, ipadx=10, pady=10)
+).grid(row=6, column=0, columnspan=2, ipadx=10, pady=10)
 
 
 # Export Blacklist #############################
@@ -4475,7 +7058,7 @@ tk.Label(
 ).grid(row=0, column=0, columnspan=2, padx=20, pady=20)
 tk.Label(
     master=IMPORT_BLACKLIST_FRAME,
-    text="Import a list of SHA1 hashes to blacklist in a defined scope.",
+    text="Import a list of SHA1 or SHA256 hashes to blacklist in a defined scope.",
     font=FRAME_SUBTITLE_FONT,
 ).grid(row=1, column=0, columnspan=2, padx=20, pady=2)
 tk.Label(
@@ -4496,7 +7079,7 @@ bl_scope_ids_list = ttk.Entry(master=IMPORT_BLACKLIST_FRAME, width=80)
 bl_scope_ids_list.grid(row=5, column=0, columnspan=2, pady=10)
 tk.Label(
     master=IMPORT_BLACKLIST_FRAME,
-    text="3. Select CSV with list of SHA1 hashes to blacklist",
+    text="3. Select CSV with list of SHA1 or SHA256 hashes to blacklist",
 ).grid(row=6, column=0, columnspan=2, padx=20, pady=2)
 ttk.Button(
     master=IMPORT_BLACKLIST_FRAME,
@@ -4506,16 +7089,49 @@ ttk.Button(
 tk.Label(master=IMPORT_BLACKLIST_FRAME, textvariable=INPUT_FILE).grid(
     row=8, column=0, columnspan=2, pady=2
 )
+bl_options_frame = ttk.Frame(master=IMPORT_BLACKLIST_FRAME)
+bl_sync_mode = tk.BooleanVar()
+bl_sync_mode.set(False)
+bl_sync_delete = tk.BooleanVar()
+bl_sync_delete.set(False)
+bl_options_frame.grid(row=9, column=0, columnspan=2, pady=2)
+tk.Label(master=bl_options_frame, text="Hashes per request:").grid(
+    row=0, column=0, padx=5
+)
+ttk.Spinbox(
+    master=bl_options_frame,
+    from_=1,
+    to=1000,
+    textvariable=BATCH_SIZE,
+    width=5,
+).grid(row=0, column=1, padx=5)
+add_concurrency_control(bl_options_frame).grid(row=0, column=2, padx=5)
+ttk.Checkbutton(
+    master=bl_options_frame,
+    text="Sync mode (only create missing entries)",
+    style="Switch",
+    variable=bl_sync_mode,
+    onvalue=True,
+    offvalue=False,
+).grid(row=1, column=0, columnspan=2, padx=5, pady=5)
+ttk.Checkbutton(
+    master=bl_options_frame,
+    text="Delete entries not in CSV",
+    style="Switch",
+    variable=bl_sync_delete,
+    onvalue=True,
+    offvalue=False,
+).grid(row=1, column=2, padx=5, pady=5)
 ttk.Button(
     master=IMPORT_BLACKLIST_FRAME,
     text="Import",
     command=import_blacklist,
-).grid(row=9, column=0, columnspan=2, pady=10)
+).grid(row=10, column=0, columnspan=2, pady=10)
 ttk.Button(
     master=IMPORT_BLACKLIST_FRAME,
     text="Back to Main Menu",
     command=go_back_to_mainpage,
-).grid(row=10, column=0, columnspan=2, ipadx=10, pady=10)
+).grid(row=11, column=0, columnspan=2, ipadx=10, pady=10)
 
 
 # Import Exclusion Frame #############################
@@ -4557,15 +7173,182 @@ ttk.Button(
 tk.Label(master=IMPORT_EXCLUSION_FRAME, textvariable=INPUT_FILE).grid(
     row=8, column=0, columnspan=2, pady=2
 )
+excl_options_frame = ttk.Frame(master=IMPORT_EXCLUSION_FRAME)
+excl_sync_mode = tk.BooleanVar()
+excl_sync_mode.set(False)
+excl_sync_delete = tk.BooleanVar()
+excl_sync_delete.set(False)
+excl_options_frame.grid(row=9, column=0, columnspan=2, pady=2)
+tk.Label(master=excl_options_frame, text="Exclusions per request:").grid(
+    row=0, column=0, padx=5
+)
+ttk.Spinbox(
+    master=excl_options_frame,
+    from_=1,
+    to=1000,
+    textvariable=BATCH_SIZE,
+    width=5,
+).grid(row=0, column=1, padx=5)
+add_concurrency_control(excl_options_frame).grid(row=0, column=2, padx=5)
+ttk.Checkbutton(
+    master=excl_options_frame,
+    text="Sync mode (only create missing entries)",
+    style="Switch",
+    variable=excl_sync_mode,
+    onvalue=True,
+    offvalue=False,
+).grid(row=1, column=0, columnspan=2, padx=5, pady=5)
+ttk.Checkbutton(
+    master=excl_options_frame,
+    text="Delete entries not in CSV",
+    style="Switch",
+    variable=excl_sync_delete,
+    onvalue=True,
+    offvalue=False,
+).grid(row=1, column=2, padx=5, pady=5)
 ttk.Button(
     master=IMPORT_EXCLUSION_FRAME,
     text="Import",
     command=import_exclusions,
-).grid(row=9, column=0, columnspan=2, pady=10)
+).grid(row=10, column=0, columnspan=2, pady=10)
 ttk.Button(
     master=IMPORT_EXCLUSION_FRAME,
     text="Back to Main Menu",
     command=go_back_to_mainpage,
+).grid(row=11, column=0, columnspan=2, ipadx=10, pady=10)
+
+
+# Query Local Data Frame #############################
+tk.Label(
+    master=LOCAL_QUERY_FRAME,
+    text="Query Local Data",
+    font=FRAME_TITLE_FONT,
+).grid(row=0, column=0, columnspan=2, padx=20, pady=20)
+tk.Label(
+    master=LOCAL_QUERY_FRAME,
+    text="Filter and aggregate console data synced to the local database without calling the API.",
+    font=FRAME_SUBTITLE_FONT,
+).grid(row=1, column=0, columnspan=2, padx=20, pady=2)
+tk.Label(
+    master=LOCAL_QUERY_FRAME,
+    text="1. Select dataset, and sync it if it has not been synced recently",
+).grid(row=2, column=0, columnspan=2, padx=20, pady=2)
+available_local_datasets = ("", *LOCAL_DATASETS)
+local_query_dataset = tk.StringVar()
+local_query_dataset.set(available_local_datasets[1])
+ttk.OptionMenu(LOCAL_QUERY_FRAME, local_query_dataset, *available_local_datasets).grid(
+    row=3, column=0, padx=10, pady=10, sticky="e"
+)
+ttk.Button(
+    master=LOCAL_QUERY_FRAME,
+    text="Sync Selected Dataset",
+    command=sync_local_data,
+).grid(row=3, column=1, padx=10, pady=10, sticky="w")
+tk.Label(
+    master=LOCAL_QUERY_FRAME,
+    text="2. Input filters separated by ';', e.g. agentVersion=22.1.4.10010; siteName=Default site; tags~Z",
+).grid(row=4, column=0, columnspan=2, padx=20, pady=2)
+tk.Label(
+    master=LOCAL_QUERY_FRAME,
+    text="Operators: = != > < >= <= and ~ (contains). Unlisted fields can be used with dotted paths.",
+    font=FRAME_SUBNOTE_FONT,
+).grid(row=5, column=0, columnspan=2, pady=2)
+local_query_filters = ttk.Entry(master=LOCAL_QUERY_FRAME, width=80)
+local_query_filters.grid(row=6, column=0, columnspan=2, pady=10)
+tk.Label(
+    master=LOCAL_QUERY_FRAME,
+    text="3. Optionally input columns to group and count by, comma-separated",
+).grid(row=7, column=0, columnspan=2, padx=20, pady=2)
+local_query_group_by = ttk.Entry(master=LOCAL_QUERY_FRAME, width=80)
+local_query_group_by.grid(row=8, column=0, columnspan=2, pady=10)
+ttk.Checkbutton(
+    master=LOCAL_QUERY_FRAME,
+    text="Export results to CSV",
+    style="Switch",
+    variable=EXPORT_QUERY_RESULTS,
+    onvalue=True,
+    offvalue=False,
+).grid(row=9, column=0, columnspan=2, pady=10)
+ttk.Button(
+    master=LOCAL_QUERY_FRAME,
+    text="Run Query",
+    command=query_local_data,
+).grid(row=10, column=0, columnspan=2, pady=10)
+ttk.Button(
+    master=LOCAL_QUERY_FRAME,
+    text="Back to Main Menu",
+    command=go_back_to_mainpage,
+).grid(row=11, column=0, columnspan=2, ipadx=10, pady=10)
+
+
+# Migrate Exclusions/Blacklist Frame #############################
+tk.Label(
+    master=MIGRATE_ENTRIES_FRAME,
+    text="Migrate Exclusions/Blacklist",
+    font=FRAME_TITLE_FONT,
+).grid(row=0, column=0, columnspan=2, padx=20, pady=20)
+tk.Label(
+    master=MIGRATE_ENTRIES_FRAME,
+    text="Copy exclusions or blacklist entries from a source console or scope into this console.",
+    font=FRAME_SUBTITLE_FONT,
+).grid(row=1, column=0, columnspan=2, padx=20, pady=2)
+tk.Label(
+    master=MIGRATE_ENTRIES_FRAME,
+    text="1. Input the source Management Console URL and API Token (leave empty to use this console)",
+).grid(row=2, column=0, columnspan=2, padx=20, pady=2)
+migrate_source_url = ttk.Entry(master=MIGRATE_ENTRIES_FRAME, width=40)
+migrate_source_url.grid(row=3, column=0, padx=10, pady=10, sticky="e")
+migrate_source_token = ttk.Entry(master=MIGRATE_ENTRIES_FRAME, width=40, show="*")
+migrate_source_token.grid(row=3, column=1, padx=10, pady=10, sticky="w")
+tk.Label(
+    master=MIGRATE_ENTRIES_FRAME,
+    text="2. Select what to migrate and the scope level",
+).grid(row=4, column=0, columnspan=2, padx=20, pady=2)
+migrate_available_datasets = ("", "exclusions", "blacklist")
+migrate_dataset = tk.StringVar()
+migrate_dataset.set(migrate_available_datasets[1])
+ttk.OptionMenu(
+    MIGRATE_ENTRIES_FRAME, migrate_dataset, *migrate_available_datasets
+).grid(row=5, column=0, padx=10, pady=10, sticky="e")
+migrate_available_scopes = ("", "group", "site", "account")
+migrate_scope = tk.StringVar()
+migrate_scope.set(migrate_available_scopes[2])
+ttk.OptionMenu(MIGRATE_ENTRIES_FRAME, migrate_scope, *migrate_available_scopes).grid(
+    row=5, column=1, padx=10, pady=10, sticky="w"
+)
+tk.Label(
+    master=MIGRATE_ENTRIES_FRAME,
+    text="3. Input scope ID mappings as source:target, comma-separated with no spaces",
+).grid(row=6, column=0, columnspan=2, padx=20, pady=2)
+migrate_scope_map = ttk.Entry(master=MIGRATE_ENTRIES_FRAME, width=80)
+migrate_scope_map.grid(row=7, column=0, columnspan=2, pady=10)
+migrate_options_frame = ttk.Frame(master=MIGRATE_ENTRIES_FRAME)
+migrate_options_frame.grid(row=8, column=0, columnspan=2, pady=2)
+tk.Label(master=migrate_options_frame, text="Entries per request:").grid(
+    row=0, column=0, padx=5
+)
+ttk.Spinbox(
+    master=migrate_options_frame,
+    from_=1,
+    to=1000,
+    textvariable=BATCH_SIZE,
+    width=5,
+).grid(row=0, column=1, padx=5)
+add_concurrency_control(migrate_options_frame).grid(row=0, column=2, padx=5)
+ttk.Button(
+    master=MIGRATE_ENTRIES_FRAME,
+    text="Dry Run",
+    command=partial(migrate_entries, True),
+).grid(row=9, column=0, padx=10, pady=10, sticky="e")
+ttk.Button(
+    master=MIGRATE_ENTRIES_FRAME,
+    text="Migrate",
+    command=partial(migrate_entries, False),
+).grid(row=9, column=1, padx=10, pady=10, sticky="w")
+ttk.Button(
+    master=MIGRATE_ENTRIES_FRAME,
+    text="Back to Main Menu",
+    command=go_back_to_mainpage,
 ).grid(row=10, column=0, columnspan=2, ipadx=10, pady=10)
 
 